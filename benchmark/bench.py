@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       end-to-end benchmark of the website with synthetic inputs
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+import sys
+from importlib import import_module
+from json import dump, dumps, loads
+from os import cpu_count, times
+from pathlib import Path
+from platform import python_version
+from shutil import copytree, copy2, rmtree
+from subprocess import run, check_output, CalledProcessError, DEVNULL
+from tempfile import mkdtemp
+from time import time
+
+Dir = Path(__file__).resolve().parent
+RepoDir = Dir.parent
+
+
+def cpu_time():
+    t = times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def timed(results, name, f, *args, **kwargs):
+    t, cpu = time(), cpu_time()
+    value = f(*args, **kwargs)
+    results[name] = {'wall': round(time() - t, 4), 'cpu': round(cpu_time() - cpu, 4)}
+    print(f'{name:<20} {results[name]["wall"]:8.2f} s', file=sys.stderr)
+    return value
+
+
+def make_workspace(path, server, workers):
+    """ copies the code into [path], so the website uses it as base directory, and configures the local sync backend """
+    for d in ['src', 'config']:
+        copytree(RepoDir.joinpath(d), path.joinpath(d), ignore=lambda *a: ['__pycache__'])
+    copy2(RepoDir.joinpath('website.py'), path)
+    copy2(Path(__file__), path)
+    [path.joinpath(*d).mkdir(parents=True, exist_ok=True) for d in [('data', 'run_logs'), ('content', 'selections')]]
+    cfg = path.joinpath('config', 'main.ini')
+    lines = cfg.read_text().splitlines()
+    opts = {'backend': 'local', 'local dir': str(server), 'workers': str(workers), 'report': ''}
+    cfg.write_text('\n'.join(f'{line.split("=")[0].strip()} = {opts[line.split("=")[0].strip()]}' if '=' in line and line.split('=')[0].strip() in opts else line for line in lines) + '\n')
+
+
+def measure():
+    """ runs inside the workspace and prints the results as json """
+    res = {}
+    sys.path.insert(0, '.')
+    data = timed(res, 'import', import_module, 'src.info')
+    from website import Website
+    from src.report import Report
+    from src.run_table import Rows
+    import src.html as html
+    import src.structure as structure
+    timed(res, 'update', data.update)
+    timed(res, 'load_tcs (cold)', data.load_tcs)
+    data.TestCampaigns = data.LazyDict(data.TCStrings, data.load_tc)
+    timed(res, 'load_tcs (cached)', data.load_tcs)
+    w = Website()
+    timed(res, 'make_dirs', structure.make_dirs)
+    for table in [w.FullRunTable, w.RunTables, w.RunPlanTable, w.DiaRunPlanTable, w.DUTTable]:
+        timed(res, f'{table.__class__.__name__}.build_all', table.build_all)
+    html.Writer.flush()
+    rmtree('content')  # the full build has to render and write every page, not only compare digests
+    Path('content', 'selections').mkdir(parents=True)
+    html.Manifest.Digests, html.Manifest.Changed = {}, True
+    Rows.Tables.clear()
+    [p.unlink() for p in Path('data', 'metadata', 'rows').glob('*.pickle')]
+    timed(res, 'build (full)', w.build, redo=True)
+    report = Report.to_dict()
+    timed(res, 'build (unchanged)', w.build)
+    print(dumps({'timing': res, 'report': report, 'cache': data.TCCache.stats()}))
+
+
+def main(args):
+    tmp = Path(mkdtemp(prefix='psi-website-bench-'))
+    try:
+        sys.path.insert(0, str(Dir))
+        from generate import generate
+        server, ws = tmp.joinpath('server'), tmp.joinpath('website')
+        res = {'parameters': {'tcs': args.tc, 'runs': args.runs, 'duts': args.duts, 'workers': args.j, 'seed': args.seed}}
+        res['timing'] = {}
+        tcs = timed(res['timing'], 'generate', generate, server, ws.joinpath('data'), args.tc, args.runs, args.duts, args.seed)
+        make_workspace(ws, server, args.j)
+        sys.path.insert(0, str(RepoDir))
+        from src.sync import LocalBackend
+        jobs = [(f'software/RateAnalysis/Runinfos/{n}.json', ws.joinpath('data')) for n in ['run_plans', 'dia_info', 'selection']]
+        jobs += [('software/RateAnalysis/config/DiamondAliases.ini', ws.joinpath('data'))]
+        jobs += [(f'scratch2/psi/psi_{tc[:4]}_{tc[4:]}/run_log.json', ws.joinpath('data', 'run_logs', f'{tc}.json')) for tc in tcs]
+        timed(res['timing'], 'sync (cold)', LocalBackend(server, args.j).fetch, jobs)
+        out = run([sys.executable, 'bench.py', '--measure'], cwd=ws, capture_output=True, text=True)
+        sys.stderr.write(out.stderr[-2000:] if out.returncode else '')
+        if out.returncode:
+            raise RuntimeError(f'benchmark failed with exit code {out.returncode}')
+        m = loads(out.stdout.strip().splitlines()[-1])  # the website prints to stdout as well
+        res['timing'].update(m['timing'])
+        res.update(report=m['report'], cache=m['cache'], pages=sum(1 for _ in ws.joinpath('content').rglob('*.html')))
+        res['system'] = {'python': python_version(), 'cpus': cpu_count(), 'commit': commit()}
+        return res
+    finally:
+        if not args.keep:
+            rmtree(tmp)
+        else:
+            print(f'kept the workspace in {tmp}', file=sys.stderr)
+
+
+def commit():
+    try:
+        return check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RepoDir, text=True, stderr=DEVNULL).strip()
+    except (CalledProcessError, OSError):
+        return 'unknown'
+
+
+if __name__ == '__main__':
+
+    from argparse import ArgumentParser
+
+    p = ArgumentParser(description='end-to-end benchmark of the website with synthetic inputs')
+    p.add_argument('-tc', type=int, default=14, help='number of test campaigns')
+    p.add_argument('-runs', type=int, default=300, help='number of runs per test campaign')
+    p.add_argument('-duts', type=int, default=3, help='number of DUTs per test campaign')
+    p.add_argument('-j', type=int, default=1, help='number of worker processes')
+    p.add_argument('-seed', type=int, default=0)
+    p.add_argument('-o', '--out', default=None, help='json file for the results (default: stdout)')
+    p.add_argument('--keep', action='store_true', help='keep the temporary workspace')
+    p.add_argument('--measure', action='store_true', help='internal: run the measurement inside the workspace')
+    args = p.parse_args()
+
+    if args.measure:
+        measure()
+    else:
+        results = main(args)
+        if args.out:
+            with open(args.out, 'w') as f:
+                dump(results, f, indent=2)
+        else:
+            print(dumps(results, indent=2))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       generates synthetic inputs of the website at a given scale
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+from datetime import datetime, timedelta
+from json import dump
+from pathlib import Path
+import h5py
+from numpy import zeros
+from numpy.random import default_rng
+
+Excluded = ['201505', '201701', '202010']  # [General] exclude tc in config/main.ini
+RunsPerPlan = 10
+MaxSlots = 3  # the run logs have at most three DUT entries (dia1 ... dia3)
+
+
+def make_tcs(n):
+    """ :returns: [n] consecutive months starting in January 2015, without the excluded ones """
+    months = (f'{2015 + i // 12}{i % 12 + 1:02d}' for i in range(10 * n))
+    return [tc for tc in months if tc not in Excluded][:n]
+
+
+def make_duts(n_tcs, n_duts):
+    """ :returns: DUT names of each test campaign. Consecutive test campaigns share half of their DUTs. """
+    return [[f'SYN{(i * n_duts) // 2 + j:03d}' for j in range(n_duts)] for i in range(n_tcs)]
+
+
+def make_runlog(tc, duts, n_runs, rng):
+    t, log = datetime.strptime(tc, '%Y%m') + timedelta(days=1), {}
+    for nr in range(1, n_runs + 1):
+        slots = [duts[((nr - 1) // RunsPerPlan + i) % len(duts)] for i in range(min(MaxSlots, len(duts)))]  # same DUTs within a run plan
+        dur = timedelta(seconds=int(rng.integers(600, 7200)))
+        log[str(nr)] = {'runnr': nr, 'runtype': 'rate scan', 'comments': '', 'persons': 'synthetic', 'events': int(rng.integers(1e5, 5e6)), 'fs11': 100., 'fs13': 50.,
+                        'starttime0': f'{t:%Y-%m-%dT%H:%M:%SZ}', 'endtime': f'{t + dur:%Y-%m-%dT%H:%M:%SZ}', 'measuredflux': float(rng.uniform(1, 2e4)),
+                        **{f'dia{i}': dut for i, dut in enumerate(slots, 1)}, **{f'dia{i}hv': float(rng.choice([-500, 500, -1000])) for i in range(1, len(slots) + 1)}}
+        t += dur + timedelta(minutes=2)
+    return log
+
+
+def make_runplans(n_runs):
+    """ :returns: run plans with [RunsPerPlan] runs each, every fifth run plan has a sub plan with the first half of its runs """
+    plans = {}
+    for i in range(n_runs // RunsPerPlan):
+        runs = list(range(i * RunsPerPlan + 1, (i + 1) * RunsPerPlan + 1))
+        plans[f'{i + 1:02d}'] = {'runs': runs, 'type': 'rate scan', 'attenuators': {f'{n}{j}': '?' for n in ['dia', 'pulser'] for j in range(1, MaxSlots + 1)}}
+        if i % 5 == 4:
+            plans[f'{i + 1:02d}.1'] = {'runs': runs[:RunsPerPlan // 2], 'type': 'voltage scan'}
+    return plans
+
+
+def make_data(n_slots, n_runs, rng):
+    """ :returns: array with shape (n_slots, n_runs + 1, 10, 2) of values and uncertainties, where about 10% of the runs have no data """
+    d = zeros((n_slots, n_runs + 1, 10, 2))
+    d[..., 0] = rng.uniform(1, 1e3, d.shape[:-1])
+    d[..., 1] = d[..., 0] * rng.uniform(.01, .1, d.shape[:-1])
+    d[:, rng.random(n_runs + 1) < .1] = 0
+    d[:, 0] = 0
+    return d
+
+
+def generate(server, data_dir, n_tcs=14, n_runs=300, n_duts=3, seed=0):
+    """ writes the inputs with the layout of the server to [server] and the analysis results to [data_dir]/data.hdf5 """
+    rng, server, data_dir = default_rng(seed), Path(server), Path(data_dir)
+    soft = server.joinpath('software', 'RateAnalysis')
+    [d.mkdir(parents=True, exist_ok=True) for d in [soft.joinpath('Runinfos'), soft.joinpath('config'), data_dir]]
+    tcs, tc_duts = make_tcs(n_tcs), make_duts(n_tcs, n_duts)
+    plans = {tc: make_runplans(n_runs) for tc in tcs}
+    for tc, duts in zip(tcs, tc_duts):
+        d = server.joinpath('scratch2', 'psi', f'psi_{tc[:4]}_{tc[4:]}')
+        d.mkdir(parents=True, exist_ok=True)
+        with open(d.joinpath('run_log.json'), 'w') as f:
+            dump(make_runlog(tc, duts, n_runs, rng), f)
+    dut_tcs = {}
+    [dut_tcs.setdefault(dut, []).append(tc) for tc, duts in zip(tcs, tc_duts) for dut in duts]
+    info = {dut: {'irradiation': {tc: rng.choice(['0', '5e14', '1e15']) for tc in t}, 'boardnumber': {tc: '1' for tc in t}, 'thickness': '500', 'size': 'None', 'manufacturer': 'II-VI'}
+            for dut, t in dut_tcs.items()}
+    selection = {f'sel-{i}': {tc: {tag: 1 for tag in list(plans[tc])[:2]} for tc in tcs[i::max(1, n_tcs // 3)]} for i in range(min(5, n_tcs))}
+    for name, d in [('run_plans', plans), ('dia_info', info), ('selection', selection)]:
+        with open(soft.joinpath('Runinfos', f'{name}.json'), 'w') as f:
+            dump(d, f)
+    soft.joinpath('config', 'DiamondAliases.ini').write_text('[ALIASES]\n' + ''.join(f'{dut.lower()} = {dut}\n' for dut in dut_tcs))
+    with h5py.File(data_dir.joinpath('data.hdf5'), 'w') as f:
+        for tc, duts in zip(tcs, tc_duts):
+            g = f.create_group(tc)
+            [g.create_dataset(str(i + 1), data=d) for i, d in enumerate(make_data(min(MaxSlots, len(duts)), n_runs, rng))]
+    return tcs
+
+
+if __name__ == '__main__':
+
+    from argparse import ArgumentParser
+
+    p = ArgumentParser(description='generates the inputs of the website at a synthetic scale')
+    p.add_argument('server', help='directory with the layout of the server, used by the local sync backend')
+    p.add_argument('data', help='data directory for the generated data.hdf5')
+    p.add_argument('-tc', type=int, default=14, help='number of test campaigns')
+    p.add_argument('-runs', type=int, default=300, help='number of runs per test campaign')
+    p.add_argument('-duts', type=int, default=3, help='number of DUTs per test campaign, at most three are used in a single run')
+    p.add_argument('-seed', type=int, default=0)
+    args = p.parse_args()
+    print(f'generated {len(generate(args.server, args.data, args.tc, args.runs, args.duts, args.seed))} test campaigns')
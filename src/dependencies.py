@@ -0,0 +1,134 @@
+# --------------------------------------------------------
+#       dependency graph between the inputs and the output pages
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+from src.utils import info, choose
+
+
+# ----------------------------------------
+# region KEYS
+TCS = ('tcs',)      # list of test campaigns
+DUTS = ('duts',)    # list of DUTs and their assignment to the test campaigns
+Scoped = ['run', 'rp']  # keys which belong to a single test campaign
+
+
+def tc(tc_id):
+    """ structure of a test campaign (list of runs and run plans)"""
+    return 'tc', str(tc_id)
+
+
+def run(tc_id, nr):
+    return 'run', str(tc_id), int(nr)
+
+
+def rp(tc_id, tag):
+    return 'rp', str(tc_id), tag
+
+
+def dut(name):
+    return 'dut', str(name)
+
+
+def sel(name):
+    return 'sel', name
+
+
+def config(section):
+    return 'config', section
+
+
+def get_tc(key):
+    return key[1] if key[0] == 'tc' or key[0] in Scoped else None
+
+
+def is_structural(key):
+    return key in [TCS, DUTS]
+# endregion KEYS
+# ----------------------------------------
+
+
+class DependencyGraph:
+    """ Records which inputs each output page reads and how to rebuild it. """
+
+    def __init__(self):
+        self.Inputs = {}    # page -> set of input keys
+        self.Builders = {}  # page -> (method, *args)
+        self.Done = None    # pages rebuilt in the current pass
+        self.Called = None  # builders called in the current pass
+        self.Added = None   # pages added in a worker process
+
+    def __len__(self):
+        return len(self.Inputs)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} with {len(self)} pages'
+
+    def add(self, page, builder, *inputs):
+        page = str(page)
+        self.Inputs[page] = set(inputs)
+        self.Builders[page] = builder
+        if self.Done is not None:
+            self.Done.add(page)
+        if self.Added is not None:
+            self.Added.append(page)
+
+    def export(self, pages):
+        """ :returns: picklable entries of the pages, the builders are stored by their method name """
+        return [(page, self.Builders[page][0].__name__, self.Builders[page][1:], self.Inputs[page]) for page in pages]
+
+    def load(self, owner, entries):
+        """ adds exported entries. All builders have to be methods of the owner. """
+        for page, name, args, inputs in entries:
+            self.add(page, (getattr(owner, name), *args), *inputs)
+
+    def clear(self):
+        self.Inputs, self.Builders = {}, {}
+
+    def needs_full(self, changed):
+        """ all pages have to be built if none were recorded yet or the structure changed """
+        return not self.Inputs or any(is_structural(key) for key in choose(changed, set()))
+
+    def affected(self, changed):
+        changed = set(choose(changed, set()))
+        return [page for page, inputs in self.Inputs.items() if inputs & changed]
+
+    def remove(self, page):
+        self.Inputs.pop(page, None)
+        self.Builders.pop(page, None)
+
+    def method(self, page):
+        f = self.Builders[page][0]
+        return getattr(f, '__func__', f)
+
+    def rebuild(self, changed):
+        """ rebuilds only the pages which depend on the changed inputs. Pages rebuilt as side product of another page are only built once.
+            The pages of test campaigns whose structure changed are built first. Their entries which were not added again (e.g. of a removed run plan or DUT slot) are removed. """
+        pages = self.affected(changed)
+        if pages:
+            info(f'rebuilding {len(pages)} of {len(self)} pages for {len(changed)} changed inputs ...')
+        tcs = {key[1] for key in choose(changed, set()) if key[0] == 'tc'}
+        self.Done, self.Called = set(), set()
+        [self.build(page) for page in pages if self.Inputs[page] & {tc(t) for t in tcs}]
+        self.remove_stale(tcs)
+        [self.build(page) for page in pages if page in self.Inputs]
+        n, self.Done, self.Called = len(self.Done), None, None
+        return n
+
+    def build(self, page):
+        """ calls the builder of [page] once per pass, the builders add the pages which they built to Done """
+        builder = self.Builders[page]
+        if page not in self.Done and builder not in self.Called:
+            self.Called.add(builder)
+            builder[0](*builder[1:])
+
+    def remove_stale(self, tcs):
+        """ removes the pages of [tcs] which are built by the same methods as the rebuilt pages, but were not added again """
+        methods = {self.method(page) for page in self.Done}
+        stale = [page for page, inputs in self.Inputs.items() if page not in self.Done and self.method(page) in methods and {get_tc(key) for key in inputs} & tcs]
+        [self.remove(page) for page in stale]
+        if stale:
+            info(f'removed {len(stale)} pages which are not built anymore')
+
+
+Graph = DependencyGraph()
@@ -6,6 +6,8 @@
 import src.html as html
 from src.utils import BaseDir, join
 import src.info as data
+import src.dependencies as dep
+from src.dependencies import Graph
 from typing import List
 
 
@@ -20,8 +22,9 @@ class DUTTable(html.File):
     def build(self, duts: List[data.DUT], filename, type_=''):
         self.set_filename(BaseDir, 'content', 'duts', f'{filename}.html')
         self.set_header(self.Website.get_header(f'{filename} Detectors'))
-        self.set_body('\n'.join([self.Website.NavBar.get(), html.table(self.title(f'{filename} {type_}s'), self.header(), self.body(duts))]))
+        self.set_body([self.Website.NavBar.get(), html.table(self.title(f'{filename} {type_}s'), self.header(), self.body(duts))])
         self.save()
+        Graph.add(self.FileName, (self.build_all,), dep.config('General'), dep.config('Manufacturers'), *[dep.dut(dut) for dut in duts], *[dep.tc(tc) for tc in data.TestCampaigns])
 
     def build_all(self):
         self.build([data.DUTs[n] for n in self.NavBar.get_sccvd_dias()], 'scCVD', 'Diamond')
@@ -6,6 +6,8 @@
 
 import src.html as html
 import src.info as data
+import src.dependencies as dep
+from src.dependencies import Graph
 from src.utils import join, quiet
 
 
@@ -19,8 +21,9 @@ class Home(html.File):
 
     def build(self):
         self.set_header(self.Website.get_header('Home', 'dia_home.png'))
-        self.set_body('\n'.join([self.Website.NavBar.get(), html.table(self.Title, self.header(), self.body())]))
+        self.set_body([self.Website.NavBar.get(), html.table(self.Title, self.header(), self.body())])
         self.save()
+        Graph.add(self.FileName, (self.build,), *[dep.tc(tc) for tc in data.TestCampaigns])
 
     @staticmethod
     def header():
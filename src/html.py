@@ -3,8 +3,17 @@
 # created on June 24th 2021 by M. Reichmann (remichae@phys.ethz.ch)
 # --------------------------------------------------------
 
-from src.utils import isfile, join, BaseDir, warning, info, PBar, add_spaces, isiter, datetime
+from src.utils import isfile, join, BaseDir, warning, info, PBar, add_spaces, isiter, datetime, ContentTree, Stats, load_json, write_atomic
+from os import remove
+from concurrent.futures import ThreadPoolExecutor, wait
+from hashlib import sha1
+from threading import BoundedSemaphore
+from json import dumps
 from os.path import basename
+from datetime import timedelta
+from functools import lru_cache
+from gzip import compress as gzip
+from numpy import array, unique, where
 from pytz import timezone, utc
 from pathlib import Path
 from typing import Any
@@ -27,9 +36,53 @@ def irr2str(val, unit=False):
     return val if val == '?' else 'nonirr' if not val or val == '0' else '{} &middot 10<sup>{}</sup>{}'.format(*val.split('e'), f' n/cm{sup(2)}' if unit else '')
 
 
+Zone = timezone('Europe/Zurich')
+Capture = None  # {filename: html as bytes} of the rendered files instead of writing them, used by the server
+Minify = False  # write the files without indentation, empty lines and comments
+Compress = []   # extensions of the precompressed siblings of every file, see Compressors
+PageSize = 0    # maximum number of rows of the pages of the large tables, 0 for a single page
+Compressors = {'gz': lambda b: gzip(b, 9, mtime=0)}
+try:
+    from brotli import compress as brotli
+    Compressors['br'] = lambda b: brotli(b, quality=11)
+except ImportError:
+    pass
+
+
+def fmt_time(t):
+    return t.strftime(f'%b %d{nth(t.day)} %H:%M:%S')
+
+
+@lru_cache(maxsize=4096)
 def conv_time(time_str, to_string=True):
-    t = datetime.strptime(time_str, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=utc).astimezone(timezone('Europe/Zurich'))
-    return t.strftime(f'%b %d{nth(t.day)} %H:%M:%S') if to_string else t
+    t = datetime.strptime(time_str, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=utc).astimezone(Zone)
+    return fmt_time(t) if to_string else t
+
+
+def parse_times(times):
+    """ :returns: array of the UTC seconds since the epoch of the run log time strings, [times] may already be in seconds """
+    t = array(times)
+    return t.astype('i8') if t.dtype.kind in 'iuf' else array([s.rstrip('Z') for s in times], 'datetime64[s]').astype('i8')
+
+
+@lru_cache(maxsize=None)
+def utc_offset(hour):
+    """ :returns: offset [s] of the local time zone at the UTC [hour] since the epoch. It only changes at full hours. """
+    return int(datetime.fromtimestamp(hour * 3600, Zone).utcoffset().total_seconds())
+
+
+def conv_times(times):
+    """ converts all run log time strings (or seconds) at once, like conv_time. :returns: list of local time strings """
+    t = parse_times(times)
+    hours, i = unique(t // 3600, return_inverse=True)
+    local = t + array([utc_offset(h) for h in hours.tolist()], 'i8')[i]
+    return [fmt_time(v) for v in local.astype('datetime64[s]').astype(object)]
+
+
+def calc_durations(starts, ends):
+    """ :returns: list of the durations between the time strings, a negative duration is shifted by one day """
+    d = parse_times(ends) - parse_times(starts)
+    return [timedelta(seconds=s) for s in where(d < 0, d + 86400, d).tolist()]
 
 
 def div(txt, *opts_):
@@ -78,7 +131,7 @@ def make_root_html():
     b.add_line('.then(file => file.readObject("c;1"))', ind=1)
     b.add_line('.then(obj => JSROOT.draw("drawing", obj, "{draw_opt}"));', ind=1)
     b = File.add_tag(b.text, 'script', 'type="text/javascript"')
-    f.set_body('\n'.join([div('', 'id="drawing"'), b]))
+    f.set_body([div('', 'id="drawing"'), b])
     return f
 
 
@@ -94,7 +147,8 @@ def style(center=False, right=False, left=False, colour=None, vcenter=False, fon
     wmin = f'min-width: {wmin}' if wmin is not None else ''
     wmax = f'max-width: {wmax}' if wmax is not None else ''
     sargs = [sarg for sarg in [align, colour, valign, fs, tf, wrp, hline, w, wmin, wmax] if sarg]
-    return f'style="{"; ".join(sargs)}"' if sargs else ''
+    sargs = [sarg.replace(': ', ':') for sarg in sargs] if Minify else sargs
+    return f'style="{(";" if Minify else "; ").join(sargs)}"' if sargs else ''
 
 
 def path(*dirs):
@@ -102,8 +156,7 @@ def path(*dirs):
 
 
 def link(target, name, active=False, center=False, new_tab=False, use_name=True, colour: Any = None, right=False, warn=True):
-    fpath = BaseDir.joinpath(target)
-    if fpath.exists() or fpath.is_dir() and fpath.joinpath('index.html').exists() or 'http' in str(target):
+    if 'http' in str(target) or ContentTree.exists(target):
         return a(name, style(center, right, colour=colour), *opts(active=active, new_tab=new_tab), *make_opt('href', path(target)))
     warning(f'The file {target} does not exist!', prnt=warn)
     return name if use_name else ''
@@ -162,11 +215,11 @@ def table(title, header, rows, *row_opts, w=None):
         h2 = File.add_tag(h2, 'tr')
         h1 = f'{h1}\n{h2}'
     h1 = File.add_tag(h1, 'thead')
-    rows = File.add_tag(File().add_lines([table_row(row, *row_opts) for row in rows]).text, 'tbody')
-    t = File.add_tag(f'{h1}\n{rows}', 'table', f'class="table table-striped custom-table" {style(wmax=w, wmin=w)}')
-    t = '\n'.join([title, File.add_tag(t, 'div', 'class="table-responsive"')])
-    t = File.add_tag(t, 'div', 'class="container"')
-    return File.add_tag(t, 'div', 'class="content"')
+    rows = wrap(Block(*[row if type(row) is str else table_row(row, *row_opts) for row in rows]), 'tbody')  # rows may be rendered already
+    t = wrap(Block(h1, rows), 'table', f'class="table table-striped custom-table" {style(wmax=w, wmin=w)}')
+    t = Block(title, wrap(t, 'div', 'class="table-responsive"'))
+    t = wrap(t, 'div', 'class="container"')
+    return wrap(t, 'div', 'class="content"')
 
 
 def table_row(row, *o):
@@ -176,6 +229,75 @@ def table_row(row, *o):
     return File.add_tag(File().add_lines([tag('td', *make_tup(txt)) for txt in row]).text, 'tr', 'scope="row"', *o, *fmt)
 
 
+def paginate(sizes, size=None):
+    """ :returns: ranges (start, end) of the groups of rows on each page. A group (rows with shared cells) is never split,
+        so a page has at most [size] rows unless a single group is larger. Appended groups only change the last page. """
+    size = PageSize if size is None else size
+    pages = [[0, 0, 0]]  # start, end, number of rows
+    for i, n in enumerate(sizes):
+        if size and pages[-1][2] and pages[-1][2] + n > size:
+            pages.append([i, i, 0])
+        pages[-1][1:] = i + 1, pages[-1][2] + n
+    return [(s, e) for s, e, n in pages]
+
+
+def page_name(i):
+    return 'index.html' if i == 0 else f'index-{i + 1}.html'
+
+
+def pagination(d, i, n):
+    """ :returns: links to the first, previous and next page of [n] pages (index.html, index-2.html, ...) in [d], the total number is not shown, so only the neighbours of a new page change """
+    items = [('&laquo;', 0, i == 0), ('&lsaquo;', i - 1, i == 0), (str(i + 1), i, None), ('&rsaquo;', i + 1, i + 1 == n)]
+    items = [tag('li', a(txt, 'class="page-link"', *make_opt('href', path(d, page_name(j)))), f'class="page-item{" active" if off is None else " disabled" if off else ""}"') for txt, j, off in items]
+    return wrap(Block(*items), 'ul', 'class="pagination justify-content-center"')
+
+
+def wrap(content, tag_, *opts_):
+    """ same as File.add_tag, but the content is not copied. The content is indented if its first line does not start with a space. """
+    content = strip_last(content)
+    return Block(f'<{tag_}{prep_opts(*opts_)}>', Block(content, ind=0 if starts_with_space(content) else 2), f'</{tag_}>')
+
+
+def strip_last(content):
+    """ removes the trailing new line """
+    if isinstance(content, Block):
+        return Block(*content.Items[:-1], strip_last(content.Items[-1]), ind=content.Ind) if content.Items else content
+    return content[:-1] if content.endswith('\n') else content
+
+
+def starts_with_space(content):
+    if isinstance(content, Block):
+        return content.Ind > 0 or bool(content.Items) and starts_with_space(content.Items[0])
+    return content.startswith(' ')
+
+
+def make_block(txt):
+    return txt if isinstance(txt, Block) else Block(*txt) if type(txt) is list else Block(txt)
+
+
+class Block:
+    """ Fragments of html which are joined by new lines. The indentation is only applied when the lines are rendered, so nesting does not copy the text. """
+
+    def __init__(self, *items, ind=0):
+        self.Items = items
+        self.Ind = ind
+
+    def __str__(self):
+        return '\n'.join(self.lines())
+
+    def lines(self, ind=0, minify=False):
+        """ :param minify: strips the indentation and skips empty lines and comments """
+        ind += self.Ind
+        for item in self.Items:
+            if isinstance(item, Block):
+                yield from item.lines(ind, minify)
+            elif minify:
+                yield from (line for line in map(str.strip, item.split('\n')) if line and not (line.startswith('<!--') and line.endswith('-->')))
+            else:
+                for line in item.split('\n'):
+                    yield f'{" " * ind}{line}' if ind else line
+
+
 LinkIcon = fig_icon(8635)
 NoIcon = fig_icon(128561)
 Good = '#5EA85E'
@@ -185,7 +307,7 @@ class File:
 
     def __init__(self, filename=None, ind_width=2, verbose=True):
         self.FileName = None if filename is None else filename if filename.startswith('/scratch') else join(BaseDir, filename)
-        self.T = ''
+        self.T = []
         self.Header = ''
         self.Body = ''
         self.Scripts = ''
@@ -195,7 +317,7 @@ class File:
         self.Verbose = verbose
 
     def __str__(self):
-        return self.T if self.Header is None else f'{self.Header}\n{self.Body}'
+        return self.text if self.Header is None else str(Block(self.Header, self.Body))
 
     def __repr__(self):
         return f'{self.__class__.__name__}: {None if self.FileName is None else basename(self.FileName)}'
@@ -207,13 +329,14 @@ class File:
         self.Header = self.add_tag(txt, 'head', *opts_)
 
     def set_body(self, txt, *opts_):
-        self.Body = self.add_tag(txt, 'body', *opts_)
+        """ :param txt: string, Block or list of fragments which are joined by new lines """
+        self.Body = wrap(make_block(txt), 'body', *opts_)
 
     def set_verbose(self, status):
         self.Verbose = status
 
     def add_line(self, txt='', ind=0):
-        self.T += f'{" " * ind * self.W}{txt}\n'
+        self.T.append(f'{" " * ind * self.W}{txt}\n')
 
     def add_lines(self, lines, ind=0):
         for line in lines:
@@ -228,29 +351,46 @@ class File:
         
     @staticmethod
     def add_tag(txt, tag_, *opts_):
-        lines = txt.split('\n')
-        lines = lines[:-1] if not lines[-1] else lines
-        if not lines[0].startswith(' '):
-            lines = [f'  {line}' for line in lines]
-        return '\n'.join([f'<{tag_}{prep_opts(*opts_)}>'] + lines + [f'</{tag_}>'])
-        
+        return str(wrap(txt, tag_, *opts_))
+
     @staticmethod
     def add_root(t):
-        t = File.add_tag(t, 'html', 'lang="en"')
-        return f'<!doctype html>\n{t}'
+        return Block('<!doctype html>', wrap(t, 'html', 'lang="en"'))
 
     def save(self, add_root=True):
-        t = self.text if not self.Header else f'{self.Header}\n{self.Body}' 
+        t = Block(self.text) if not self.Header else Block(self.Header, self.Body)
         if add_root:
             t = self.add_root(t)
-        with open(self.FileName, 'w+') as f:
-            f.write(t)
-            f.truncate()
+        content = '\n'.join(t.lines(minify=Minify)).encode()
+        if Capture is not None:
+            Capture[str(self.FileName)] = content
+            return
+        digest = sha1(content + ' '.join(Compress).encode()).hexdigest()
+        if Manifest.is_same(self.FileName, digest):
+            Stats['skipped'] += 1
+            return
+        Writer.submit(self.FileName, content, digest, self.siblings())
+        Stats['pages'] += 1
+        Stats['bytes'] += len(content)
+        ContentTree.add(self.FileName)
         self.info(f'wrote file {self.FileName}')
 
+    def siblings(self):
+        """ adds the precompressed siblings (e.g. index.html.gz) for the web server to the content tree.
+            :returns: the siblings which are not configured anymore and have to be removed """
+        old = []
+        for ext in Compressors:
+            name = f'{self.FileName}.{ext}'
+            if ext in Compress:
+                ContentTree.add(name)
+            elif ContentTree.is_file(name):
+                ContentTree.discard(name)
+                old.append(name)
+        return old
+
     @property
     def text(self):
-        return self.T
+        return ''.join(self.T)
 
     def show(self):
         print(self.text)
@@ -258,21 +398,126 @@ class File:
     def info(self, txt, endl=True, prnt=True):
         return info(txt, endl, prnt=prnt and self.Verbose)
 
-    def check_content(self):
-        if isfile(self.FileName):
-            with open(self.FileName) as f:
-                return self.T == ''.join(f.readlines())
-        return False
+    def save_pages(self, i, n, *body):
+        """ saves the page [i] of [n] with the [body] and the navigation between the pages. The unused pages are removed after the last one. """
+        d = self.FileName.parent
+        self.set_body([*body, pagination(d.relative_to(BaseDir), i, n)] if n > 1 else list(body))
+        self.save()
+        if i == n - 1 and Capture is None:
+            while ContentTree.is_file(d.joinpath(page_name(n))):
+                for f in [d.joinpath(page_name(n)), *[d.joinpath(f'{page_name(n)}.{ext}') for ext in Compressors]]:
+                    if ContentTree.is_file(f):
+                        remove(f)
+                        ContentTree.discard(f)
+                n += 1
 
     def clear(self):
-        self.T = self.Header = self.Body = self.Scripts = ''
+        self.T, self.Header, self.Body, self.Scripts = [], '', '', ''
+
+
+class PageManifest:
+    """ Digests of the written files, which are kept between the builds, so unchanged files are neither read nor written again. """
+
+    def __init__(self, filename):
+        self.FileName = Path(filename)
+        self.Digests = None
+        self.Changed = False
+        self.Added = None  # digests of the files written in a worker process
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} of {len(self.load())} files'
+
+    def load(self):
+        if self.Digests is None:
+            self.Digests = load_json(self.FileName)
+        return self.Digests
+
+    def is_same(self, filename, digest):
+        return self.load().get(str(filename)) == digest and ContentTree.is_file(filename)
+
+    def add(self, filename, digest):
+        self.load()[str(filename)] = digest
+        self.Changed = True
+        if self.Added is not None:
+            self.Added.append((str(filename), digest))
+
+    def save(self):
+        if self.Changed:
+            self.FileName.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(self.FileName, dumps(self.Digests).encode())
+            self.Changed = False
+
+
+class PageWriter:
+    """ Writes the rendered pages in a pool of threads, so the rendering continues while the files are written.
+        At most [max_pending] pages wait to be written, further pages block the rendering. Writes of the same file keep their order.
+        flush() waits for all writes and raises the first error of the threads. """
+
+    def __init__(self, n_threads=4, max_pending=64):
+        self.NThreads = n_threads
+        self.MaxPending = max_pending
+        self.Pool = None
+        self.Pending = {}  # {filename: future}
+        self.Slots = BoundedSemaphore(max_pending)
+        self.Error = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} with {self.NThreads} threads, {len(self.Pending)} pending pages'
+
+    def configure(self, n_threads, max_pending):
+        self.flush()
+        self.__init__(n_threads, max_pending)
+
+    def reset(self):
+        """ drops the threads of the parent process after forking """
+        self.__init__(self.NThreads, self.MaxPending)
+
+    def submit(self, filename, content, digest, old=()):
+        if self.NThreads < 1:
+            return self.write(filename, content, digest, old)
+        self.check()
+        if str(filename) in self.Pending:
+            wait([self.Pending[str(filename)]])  # an error is raised once by check or flush
+        if self.Pool is None:
+            self.Pool = ThreadPoolExecutor(self.NThreads, thread_name_prefix='writer')
+        self.Slots.acquire()
+        future = self.Pool.submit(self.write, filename, content, digest, old)
+        future.add_done_callback(self.done)
+        self.Pending[str(filename)] = future
+
+    @staticmethod
+    def write(filename, content, digest, old=()):
+        write_atomic(filename, content)
+        for ext, f in Compressors.items():
+            if ext in Compress:
+                write_atomic(f'{filename}.{ext}', f(content))
+        [remove(name) for name in old if isfile(name)]
+        Manifest.add(filename, digest)
+
+    def done(self, future):
+        self.Slots.release()
+        if future.exception() is not None and self.Error is None:
+            self.Error = future.exception()
+
+    def check(self):
+        if self.Error is not None:
+            e, self.Error = self.Error, None
+            raise e
+
+    def flush(self):
+        """ waits until all pages are written """
+        wait(list(self.Pending.values()))
+        self.Pending = {}
+        self.check()
 
 
 ROOTHTML = make_root_html()
+Manifest = PageManifest(join(BaseDir, 'data', 'metadata', 'pages.json'))
+Writer = PageWriter()
 
 
 def create_root(file_path: Path, title='', draw_opt='colz', pal=55):
     f = File(str(file_path.with_suffix('.html')))
-    f.set_body(ROOTHTML.Body.format(pal=pal, filename=file_path.name, draw_opt=draw_opt))
+    f.set_body(str(ROOTHTML.Body).format(pal=pal, filename=file_path.name, draw_opt=draw_opt))
     f.set_header(ROOTHTML.Header.format(title=f'{add_spaces(file_path.stem.title())} {title}'))
     f.save()
@@ -4,17 +4,21 @@
 # created on December 20th 2018 by M. Reichmann (remichae@phys.ethz.ch)
 # --------------------------------------------------------
 
-from src.utils import Configuration, BaseDir, join, load_json, info, warning, critical, datetime, loads, make_list, isfile, ufloat, pickle, update_pbar, PBAR, choose
-from subprocess import getstatusoutput, check_output, CalledProcessError
+from src.utils import Configuration, BaseDir, join, load_json, write_atomic, info, add_to_info, warning, critical, datetime, loads, dumps, make_list, isfile, Path, ufloat, cached, Cache, update_pbar, PBAR, choose, ContentTree, LazyDict
+from subprocess import CalledProcessError
 from datetime import timedelta
 import h5py
 from glob import glob
-from numpy import zeros, errstate, average, sum as npsum, isnan, array, log10, append
-from os import environ
-from src.html import conv_time, irr2str, basename
+from numpy import zeros, errstate, isnan, array, log10, char, where, stack, argwhere, maximum, minimum, add, logical_and, divide, full, nan, concatenate, cumsum
+from os import environ, stat, replace
+from os.path import getsize
+from src.html import conv_time, conv_times, calc_durations, irr2str, basename
 import src.latex as latex
-from hashlib import md5
 from operator import itemgetter
+import src.dependencies as dep
+import src.sync as sync
+from src.runlog import RunLog
+from src.report import Report
 
 
 # ----------------------------------------
@@ -25,6 +29,10 @@ def load_config():
 
 def load_dut_parser():
     return Configuration(join(Dir, 'DiamondAliases.ini'))
+
+
+def load_sync():
+    return sync.make_backend(Config)
 # endregion CONFIG
 # ----------------------------------------
 
@@ -38,14 +46,109 @@ ServerName = Config.get('Server', 'host')
 ServerData = Config.get('Server', 'data')
 ServerSoft = Config.get('Server', 'software')
 Excluded = [dut.lower() for dut in Config.get_list('General', 'excluded')]
+Sync = load_sync()
+Synced = {}  # results of the last transfers from the server
 
 # DATA FILE
 environ['HDF5_USE_FILE_LOCKING'] = 'FALSE'
-File = h5py.File(join(Dir, 'data.hdf5'), 'a')
 
 
 # ----------------------------------------
 # region CLASSES
+class DataCache:
+    """ In-memory copy of the HDF5 data of each test campaign with shape (n_dut_slots, n_runs, 10, 2). Has to be invalidated if the file changes.
+        The file is only opened at the first access, read-only, except for creating and extending the datasets. The datasets have an unlimited number of runs, so they grow in place.
+        They are stored in compressed chunks, so the zeros of runs without data and of the unused part of the last chunk take no space. """
+
+    ChunkRuns = 128  # runs per chunk (20 kB uncompressed)
+
+    def __init__(self, filename):
+        self.FileName = filename
+        self.F = None
+        self.Data = {}
+        self.Stat = None  # modification time and size of the file at the last update
+
+    def __getitem__(self, tc):
+        if tc not in self.Data:
+            self.Data[tc] = self.load(tc)
+        return self.Data[tc]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} with {len(self.Data)} test campaigns ({sum(d.nbytes for d in self.Data.values()) / 2 ** 20:.1f} MB)'
+
+    @property
+    def File(self):
+        if self.F is None:
+            self.F = h5py.File(self.FileName, 'r')
+        return self.F
+
+    def writable(self):
+        """ :returns: the file opened for writing, which has to be closed afterwards, since a writable handle overwrites the changes of other processes """
+        if self.F is not None and self.F.mode == 'r':
+            self.close()
+        if self.F is None:
+            self.F = h5py.File(self.FileName, 'a')
+        return self.F
+
+    def load(self, tc):
+        return array([self.File[tc][key] for key in self.File[tc]])
+
+    def close(self):
+        if self.F is not None:
+            self.F.close()
+            self.F = None
+
+    def create(self, tc, slot, n):
+        """ creates the resizable dataset of the DUT [slot] with [n] runs """
+        return self.writable()[tc].create_dataset(str(slot), (n, 10, 2), 'd', maxshape=(None, 10, 2), chunks=(DataCache.ChunkRuns, 10, 2), compression='gzip')
+
+    def resize(self, tc, slot, n):
+        """ extends the dataset of the DUT [slot] with zeros to [n] runs. Datasets with a fixed size are converted once. """
+        d = self.writable()[tc][str(slot)]
+        if d.maxshape[0] is None:
+            d.resize(n, axis=0)
+        else:
+            data = d[()]
+            del self.F[tc][str(slot)]
+            self.create(tc, slot, n)[:data.shape[0]] = data
+
+    def compact(self):
+        """ rewrites the file with resizable datasets, which also frees the space of deleted datasets. :returns: file size before and after """
+        self.close()
+        size, tmp = getsize(self.FileName), f'{self.FileName}.tmp'
+        with h5py.File(self.FileName, 'r') as f, h5py.File(tmp, 'w') as new:
+            for tc, g in f.items():
+                new.create_group(tc)
+                for key, d in g.items():
+                    data = d[()]
+                    new[tc].create_dataset(key, data=data, maxshape=(None, *data.shape[1:]), chunks=(DataCache.ChunkRuns, *data.shape[1:]), compression='gzip')
+        replace(tmp, self.FileName)
+        self.invalidate()
+        return size, getsize(self.FileName)
+
+    def stat(self):
+        s = stat(self.FileName)
+        return s.st_mtime_ns, s.st_size
+
+    def update(self):
+        """ invalidates all data and reopens the file if it changed on disk since the last call, since the chunk cache of h5py would return the old values.
+            :returns: whether the file changed, always True for the first call """
+        changed = self.Stat != self.stat()
+        if changed:
+            self.close()  # flushes our own changes, so the file is stat again
+            self.invalidate()
+            self.Stat = self.stat()
+        return changed
+
+    def invalidate(self, tc=None):
+        """ removes the data of [tc] or of all test campaigns if tc is None """
+        self.Data.pop(tc, None) if tc is not None else self.Data.clear()
+
+    def get(self, tc, dut_nrs, runs):
+        """ :returns: data of the runs for the given DUT numbers (starting at 1) with shape (len(dut_nrs), len(runs), 10, 2) """
+        return self[tc][[i - 1 for i in dut_nrs]][:, runs]
+
+
 class DUT:
     """ Class with all information about a single DUT. """
     def __init__(self, name, specs):
@@ -103,11 +206,11 @@ class DUT:
 
     @property
     def rp_tcs(self):
-        return [tc.ID for tc in TestCampaigns.values() if self.Name in tc.runplan_duts]
+        return Index.rp_tcs(self.Name)
 
     @property
     def tcs(self):
-        tcs = [tc.ID for tc in TestCampaigns.values() if self.Name in tc.DUTs]
+        tcs = Index.tcs(self.Name)
         return tcs if tcs else [tc for tc in self.Irradiation if tc in TestCampaigns]
 
     def get_board_number(self, tc):
@@ -159,17 +262,26 @@ class TestCampaign:
         self.LongName = self.to_str(name, short=False)
         self.Location = 'PSI'
         self.LogFile = join(BaseDir, 'data', 'run_logs', f'{name}.json')
-        self.Log = load_json(self.LogFile)
-        self.NMaxDUTs = len(list(set([key for dic in self.Log.values() for key in dic if key.startswith('dia') and len(key) == 4])))
+        self.Log = load_runlog(name)
+        self.NMaxDUTs = len([key for key in self.Log.Keys if key.startswith('dia') and len(key) == 4])
 
         self.fill_empty_data()
         data = self.data
+        data_str = make_data_strs(data)
 
-        self.Runs = {int(nr): Run(name, nr, log, data) for nr, log in self.Log.items() if log['runtype'] not in TestCampaign.BadTypes}
+        times = self.load_times()
+        self.Runs = {int(nr): Run(name, nr, log, data_str, times[nr]) for nr, log in self.Log.items() if log['runtype'] not in TestCampaign.BadTypes}
         self.DUTs = self.load_duts()
         self.DUTTypes = {dut: DUTs[dut].get_type(self.ID) for dut in self.DUTs if dut in DUTs}
-        self.RunPlans = [RunPlan(tag, name) for tag in RPDic[name]]
-        self.Hash = md5(data).hexdigest()
+        self.RunPlans = [RunPlan(tag, name, times=times, aggregate=False) for tag in RPDic[name]]
+        self.aggregate(data)
+        self.Snapshot = data  # to find changed rows
+
+        # INDEX
+        self.DUTRuns, self.DUTRunPlans = self.index_duts()
+        self.RunPlanRuns = [self.Runs[nr] for nr in sorted(set(nr for rp in self.RunPlans for nr in rp.RunNumbers))]
+        self.RunPlanTags = {rp.Tag: rp for rp in self.RunPlans}
+        self.SubPlans = self.group_runplans()
 
     def __repr__(self):
         return f'{self.__class__.__name__} {self.Name}, {len(self.Runs)} Runs'
@@ -180,36 +292,77 @@ class TestCampaign:
     def load_duts(self):
         return sorted(list(set(dut for run in self.Runs.values() for dut in run.DUTs if not dut.startswith('?') and dut not in ['unknown', 'None'])))
 
+    def load_times(self):
+        """ converts the time strings of all good runs at once. :returns: {run number: (start time string, duration)} """
+        nrs = [nr for nr, t in zip(self.Log, self.Log.column('runtype')) if t not in TestCampaign.BadTypes]
+        starts, ends = self.Log.times('starttime0', nrs), self.Log.times('endtime', nrs)
+        return dict(zip(nrs, zip(conv_times(starts), calc_durations(starts, ends))))
+
     def fill_empty_data(self):
-        if self.ID not in File:
-            File.create_group(self.ID)
+        """ creates or extends the datasets of all DUT slots to the number of runs, the file is only opened for writing if one is missing or too short """
+        nruns, g = int(max(self.Log, key=int)), Data.File.get(self.ID)
+        if g is not None and all(str(i) in g and g[str(i)].shape[0] >= nruns + 1 for i in range(1, self.NMaxDUTs + 1)):
+            return
+        f = Data.writable()
+        if self.ID not in f:
+            f.create_group(self.ID)
             info(f'created group for {self}')
         for i in range(1, self.NMaxDUTs + 1):
-            nruns = int(max(self.Log, key=int))
-            if not str(i) in File[self.ID]:
-                File[self.ID].create_dataset(str(i), data=zeros((nruns + 1, 10, 2), 'd'))
-                info(f'created dataset {i} with shape {File[self.ID][str(i)].shape} for {self}')
-            if File[self.ID][str(i)].shape[0] < nruns + 1:
-                data = append(File[self.ID][str(i)], zeros((nruns - File[self.ID][str(i)].shape[0] + 1, 10, 2), 'd'), axis=0)
-                del File[self.ID][str(i)]
-                File[self.ID].create_dataset(str(i), data)
-                info(f'extended dataset {i} with shape {File[self.ID][str(i)].shape} for {self}')
+            if not str(i) in f[self.ID]:
+                Data.create(self.ID, i, nruns + 1)
+                info(f'created dataset {i} with shape {f[self.ID][str(i)].shape} for {self}')
+            if f[self.ID][str(i)].shape[0] < nruns + 1:
+                Data.resize(self.ID, i, nruns + 1)
+                info(f'extended dataset {i} with shape {f[self.ID][str(i)].shape} for {self}')
+        Data.close()
+        Data.invalidate(self.ID)
 
     @property
     def data(self):
-        return array([File[self.ID][key] for key in File[self.ID]])
-
-    @property
-    def has_new_data(self):
-        return md5(self.data).hexdigest() != self.Hash
+        return Data[self.ID]
+
+    def find_new_data(self):
+        """ :returns: list of (DUT slot, run number) whose values changed since the data of the test campaign was loaded. """
+        return find_row_changes(self.Snapshot, self.data)
+
+    def update_data(self, rows):
+        """ updates only the strings of the runs and run plans affected by the changed [rows] """
+        runs, data = set(nr for slot, nr in rows if nr in self.Runs), self.data
+        for nr in runs:
+            self.Runs[nr].FullData = self.Runs[nr].get_data_str(data)
+        self.aggregate(data, [rp for rp in self.RunPlans if runs.intersection(rp.RunNumbers)])
+        self.Snapshot = data
+
+    def aggregate(self, data, rps=None):
+        """ sets the strings and the maximum flux of the run plans [rps] (all by default) from a single aggregation of the [data] """
+        rps = choose(rps, self.RunPlans)
+        for rp, (strs, flux) in zip(rps, aggregate_runplans(data, rps)):
+            rp.DataStr, rp.MaxFlux = strs, flux
+
+    def index_duts(self):
+        """ :returns: run numbers and run plans of each DUT name """
+        runs, rps = {}, {}
+        for nr, run in self.Runs.items():
+            for dut in dict.fromkeys(run.DUTs):
+                runs.setdefault(dut, []).append(nr)
+        for rp in self.RunPlans:
+            for dut in dict.fromkeys(dut.Name for dut in rp.DUTs):
+                rps.setdefault(dut, []).append(rp)
+        return runs, rps
+
+    def group_runplans(self):
+        """ :returns: main tag -> main run plan and its sub plans """
+        groups = {}
+        [groups.setdefault(rp.Main, []).append(rp) for rp in self.RunPlans]
+        return groups
 
     @property
     def runplan_runs(self):
-        return sorted(list(set(self.Runs[nr] for rp in self.RunPlans for nr in rp.RunNumbers)))
+        return self.RunPlanRuns
 
     @property
     def runplan_duts(self):
-        return list(set(dut.Name for rp in self.RunPlans for dut in rp.DUTs))
+        return list(self.DUTRunPlans)
 
     @property
     def dut_types(self):
@@ -217,13 +370,17 @@ class TestCampaign:
         return sorted(set('bcm\'' if t.startswith('pad') and t.endswith(')') else t for t in types))
 
     def get_dut_runs(self, dut):
-        return [nr for nr, run in self.Runs.items() if dut in run.DUTs]
+        return self.DUTRuns.get(str(dut), [])
 
     def get_dut_runplans(self, dut):
-        return [rp for rp in self.RunPlans if dut in rp.DUTs]
+        return self.DUTRunPlans.get(str(dut), [])
 
     def get_runplan(self, name):
-        return self.RunPlans[[rp.Tag for rp in self.RunPlans].index(RunPlan.make_tag(name))]
+        return self.RunPlanTags[RunPlan.make_tag(name)]
+
+    def get_nsub(self, rp):
+        """ :returns: number of run plans in the group of [rp], including the main plan """
+        return len(self.SubPlans[rp.Main])
 
     @staticmethod
     def to_str(tc, short=True):
@@ -232,7 +389,7 @@ class TestCampaign:
 
 class RunPlan:
 
-    def __init__(self, tag, tc, data=None):
+    def __init__(self, tag, tc, data=None, times=None, aggregate=True):
 
         # MAIN
         self.Tag = tag
@@ -241,7 +398,7 @@ class RunPlan:
         self.ShortName = f'RP {tag.lstrip("0")}'
         self.TCString = TestCampaign.to_str(tc, short=False)
         self.IsMain = self.Tag.isdigit()
-        self.NSub = sum(rp.startswith(self.Tag.split('.')[0]) for rp in RPDic[self.TC])
+        self.Main = self.Tag.split('.')[0]
 
         # LOG DATA
         rp = RPDic[tc][tag]
@@ -251,8 +408,8 @@ class RunPlan:
         self.DUTNrs = [i for i in range(1, 4) if f'dia{i}' in log]
         self.NDUTs = len(self.DUTNrs)
         self.DUTs = [DUTs[DUT.translate(log[f'dia{i}'])] for i in self.DUTNrs]
-        self.StartTime = conv_time(log['starttime0'])
-        self.Duration = self.calc_duration()
+        self.StartTime = conv_time(log['starttime0']) if times is None else times[str(self.RunNumbers[0])][0]
+        self.Duration = self.calc_duration() if times is None else sum([times[str(run)][1] for run in self.RunNumbers], timedelta())
 
         # INFO
         self.Type = rp['type'].replace('_', ' ')
@@ -267,8 +424,8 @@ class RunPlan:
         # STRINGS
         self.EventStr = self.get_total_events()
         self.RunStr = f'{self.RunNumbers[0]:03d}-{self.RunNumbers[-1]:03d}'
-        self.BiasStr = [make_bias_str([RunLogs[self.TC][str(run)][f'dia{i}hv'] for run in self.RunNumbers]) for i in self.DUTNrs]
-        self.DataStr = self.get_data_str(data)
+        self.BiasStr = [make_bias_str(RunLogs[self.TC].column(f'dia{i}hv', self.RunNumbers)) for i in self.DUTNrs]
+        self.DataStr, self.MaxFlux = aggregate_runplans(Data[tc] if data is None else data, [self])[0] if aggregate else (None, None)  # set by TestCampaign.aggregate otherwise
 
     def load_amp(self, rp):
         if 'pixel' in self.DUTs[0].get_type(self.TC):
@@ -285,7 +442,7 @@ class RunPlan:
         return f'RP-{self.Tag.lstrip("0").replace(".", "-")}'
 
     def get_total_events(self):
-        evts = [log['events'] for log in [RunLogs[self.TC][str(run)] for run in self.RunNumbers] if 'events' in log]
+        evts = [n for n in RunLogs[self.TC].column('events', self.RunNumbers) if n is not None]
         return make_ev_str(sum(evts)) if len(evts) == self.Size else '?'
 
     def get_irradiation(self, dut_nr):
@@ -307,7 +464,7 @@ class RunPlan:
     @property
     def is_complete(self):
         names = ['FluxProfile', 'PulseHeightFlux'] + (['Efficiencies'] if self.is_pixel else ['NoiseFlux', 'PedestalFlux', 'PulserPH', 'PulserSigma'])
-        return all(isfile(join(BaseDir, d, f'{n}.html')) for n in names for d in self.RelDirs)
+        return all(ContentTree.is_file(join(d, f'{n}.html')) for n in names for d in self.RelDirs)
 
     def load_attenuators(self, log, rp, pulser=False):
         if 'pixel' in self.DUTs[0].get_type(self.TC):
@@ -319,24 +476,11 @@ class RunPlan:
     def get_attenuators(self, dut_nr):
         return [self.Attenuators[dut_nr], self.PulserAttenuators[dut_nr]]
 
-    @staticmethod
-    def flux2str(values):
-        return f'{min(values):.0f} ... {max(values):.0f}' if all(values) else '-'
-
     def calc_duration(self):
         return sum([Run.calc_duration(RunLogs[self.TC][str(run)]) for run in self.RunNumbers], timedelta())
 
     def get_max_flux(self):
-        return [max(array(File[self.TC][str(i)][self.RunNumbers][:, 0, 0])) for i in self.DUTNrs]
-
-    def get_data_str(self, data=None):
-        """:returns:
-        [flux, cur, ph, ped, noise, pulph, pulsig, events]"""
-        form = [.1, .1,  .1,    .1,    .1,     .1]
-        d = array([File[self.TC][str(i)][self.RunNumbers] for i in self.DUTNrs]) if data is None else data[:self.NDUTs, self.RunNumbers]
-        with errstate(divide='ignore', invalid='ignore'):  # catch zero divide errors
-            values, events = average(d[:, :, 1:7, 0], axis=1, weights=1 / d[:, :, 1:7, 1]), npsum(d[:, :, -1, 0], axis=1)
-        return [[RunPlan.flux2str(d[i, :, 0, 0])] + ['-' if isnan(v) else f'{v:{f}f}' for v, f in zip(values[i], form)] + [make_ev_str(events[i])] for i in range(self.NDUTs)]
+        return self.MaxFlux
 
     @staticmethod
     def make_tag(name):
@@ -344,15 +488,14 @@ class RunPlan:
 
 
 class Run:
-    def __init__(self, tc, number, log=None, data=None):
+    def __init__(self, tc, number, log=None, data_str=None, times=None):
         # MAIN
         self.TC = tc
         self.Number = int(number)
 
         # LOG INFO
         log = RunLogs[tc][str(number)] if log is None else log
-        self.StartTime = conv_time(log['starttime0'])
-        self.Duration = Run.calc_duration(log)
+        self.StartTime, self.Duration = choose(times, lambda: (conv_time(log['starttime0']), Run.calc_duration(log)))
         self.DUTNrs = [i for i in range(1, 4) if f'dia{i}' in log]
         self.NDUTs = len(self.DUTNrs)
         self.DUTs = [DUT.translate(log[f'dia{i}']) for i in self.DUTNrs]
@@ -366,7 +509,7 @@ class Run:
 
         # Strings
         self.EventStr = make_ev_str(self.NEvents)
-        self.FullData = self.get_data_str(data)
+        self.FullData = self.get_data_str() if data_str is None else data_str[:self.NDUTs, self.Number].tolist()
 
     def __repr__(self):
         return f'{self.__class__.__name__} {self.Number} ({self.TC})'
@@ -389,24 +532,109 @@ class Run:
     def get_data_str(self, data=None):
         """:returns:
                [flux, cur, ph, ped, noise, pulph, pulsig, pulped, pulnoi, events]"""
-        form = [.0,    .1, .1,  .1,    .2,    .1,     .2,     .2,    .2]
-        is_u = [0,      1,  1,   0,     0,     1,      0,      0,     0,       0]
-        data = array([File[self.TC][str(i)][self.Number] for i in self.DUTNrs]) if data is None else data[range(self.NDUTs), self.Number]
-        data = [[ufloat(*data[j][i]) if u else data[j][i][0] for i, u in enumerate(is_u)] for j in range(self.NDUTs)]
-        return [[(make_ev_str(v) if i == 9 else f'{v:{form[i]}f}') if v else '-' for i, v in enumerate(row)] for row in data]
+        data = Data.get(self.TC, self.DUTNrs, [self.Number]) if data is None else data[:self.NDUTs, [self.Number]]
+        return make_data_strs(data)[:, 0].tolist()
+
+
+class DUTIndex:
+    """ Inverted index from the DUT names to the test campaigns, runs and run plans. The test campaigns are indexed when they are (re)loaded (see load_tc).
+        The DUT names of every indexed test campaign are saved, so the test campaigns of a DUT are known without loading all of them, e.g. for a single campaign build.
+        Only the runs and run plans require all test campaigns to be loaded. """
+
+    def __init__(self, filename):
+        self.FileName = Path(filename)
+        self.TCs = {}       # tc id -> indexed TestCampaign
+        self.Runs = {}      # dut -> {tc id: run numbers}
+        self.RunPlans = {}  # dut -> {tc id: run plans}
+        self.Names = None   # tc id -> [DUT names, DUT names with run plans] of all test campaigns which were ever indexed
+        self.Changed = False
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} of {len(self.Runs)} DUTs in {len(self.TCs)} test campaigns'
+
+    def load(self):
+        if self.Names is None:
+            self.Names = load_json(self.FileName)
+        return self.Names
+
+    def save(self):
+        if self.Changed:
+            self.FileName.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(self.FileName, dumps(self.Names).encode())
+            self.Changed = False
+
+    def update(self):
+        """ loads the test campaigns which are not indexed yet """
+        if len(self.TCs) < len(TestCampaigns):
+            [TestCampaigns[tc] for tc in TestCampaigns if tc not in self.TCs]
+        return self
+
+    def add(self, tc):
+        self.remove(tc.ID)
+        self.TCs[tc.ID] = tc
+        [self.Runs.setdefault(dut, {}).update({tc.ID: nrs}) for dut, nrs in tc.DUTRuns.items()]
+        [self.RunPlans.setdefault(dut, {}).update({tc.ID: rps}) for dut, rps in tc.DUTRunPlans.items()]
+        names = [tc.DUTs, list(tc.DUTRunPlans)]
+        if self.load().get(tc.ID) != names:
+            self.Names[tc.ID], self.Changed = names, True
+        return tc
+
+    def remove(self, tc_id):
+        if self.TCs.pop(tc_id, None) is not None:
+            [d.pop(tc_id, None) for index in [self.Runs, self.RunPlans] for d in index.values()]
+
+    def forget(self, tc_id):
+        """ removes [tc_id] also from the saved names, e.g. if its inputs changed """
+        self.remove(tc_id)
+        if self.load().pop(tc_id, None) is not None:
+            self.Changed = True
+
+    def duts(self, tc_id):
+        """ :returns: DUT names and the DUT names with run plans of [tc_id] from the index or the saved names, it is only loaded if it is in neither """
+        if tc_id not in self.TCs and tc_id not in self.load():
+            TestCampaigns[tc_id]  # loading indexes the test campaign
+        return self.Names[tc_id] if tc_id not in self.TCs else [self.TCs[tc_id].DUTs, self.TCs[tc_id].DUTRunPlans]
+
+    def tcs(self, dut):
+        """ :returns: ids of the test campaigns in which [dut] was measured, in the order of TCStrings """
+        return [tc for tc in TestCampaigns if str(dut) in self.duts(tc)[0]]
+
+    def rp_tcs(self, dut):
+        return [tc for tc in TestCampaigns if str(dut) in self.duts(tc)[1]]
+
+    def runs(self, dut):
+        """ :returns: {tc id: run numbers} of [dut] """
+        return self.update().Runs.get(str(dut), {})
+
+    def runplans(self, dut):
+        """ :returns: {tc id: run plans} of [dut] """
+        return self.update().RunPlans.get(str(dut), {})
 # endregion CLASSES
 # ----------------------------------------
 
 
+Index = DUTIndex(join(Dir, 'metadata', 'duts.json'))
+Data = DataCache(join(Dir, 'data.hdf5'))
+TCCache = Cache(join(Dir, 'metadata'), version=Cache.digest(*[Path(f).read_bytes() for f in [__file__, join(BaseDir, 'src', 'html.py'), join(BaseDir, 'src', 'runlog.py')]]), max_size=Config.get_value('Build', 'cache size', default=500))
+
+
 # ----------------------------------------
 # region INIT
 def find_testcampaigns():
-    words = [word for word in getstatusoutput(f'ssh -tY {ServerName} ls {join("/scratch2", "psi")}')[1].split()[:-1] if word.startswith('psi')]
+    """ asks the server for the test campaigns, falls back to the local run logs if it is not reachable """
+    try:
+        words = [word for word in Sync.listdir(ServerData) if word.startswith('psi')]
+    except (CalledProcessError, OSError):
+        words = []
     if not words:
-        return [basename(word).replace('.json', '') for word in glob(join(Dir, 'run_logs', '*.json'))]
+        return find_local_testcampaigns()
     return [tc for tc in sorted(tc.replace('psi_', '').replace('_', '').strip('\t') for tc in words) if tc not in Config.get_list('General', 'exclude tc')]
 
 
+def find_local_testcampaigns():
+    return [tc for tc in sorted(basename(word).replace('.json', '') for word in glob(join(Dir, 'run_logs', '*.json'))) if tc not in Config.get_list('General', 'exclude tc')]
+
+
 def get_years(test_campaigns):
     return ['< 2015'] + sorted(list(set([tc[:4] for tc in test_campaigns])))
 
@@ -417,29 +645,57 @@ def load_runplans():
 
 def load_duts():
     d = {DUT.translate(key): value for key, value in load_json(join(Dir, 'dia_info.json')).items()}
-    return {key: DUT(key, value) for key, value in d.items()}
+    return LazyDict(d, lambda key: DUT(key, d[key]))
+
+
+def load_runlog(tc):
+    return RunLog(join(Dir, 'run_logs', f'{tc}.json'), join(Dir, 'metadata', 'run_logs'))
 
 
 def load_runlogs():
-    return {tc: load_json(join(Dir, 'run_logs', f'{tc}.json')) for tc in TCStrings}
+    return LazyDict(TCStrings, load_runlog)
+
+
+def tc_inputs(tc):
+    """ :returns: all inputs of a TestCampaign """
+    files = [join(Dir, 'run_logs', f'{tc}.json'), join(Dir, 'dia_info.json'), join(Dir, 'DiamondAliases.ini')]
+    return [Path(f).read_bytes() if isfile(f) else b'' for f in files] + [RPDic.get(tc), *data_inputs(tc)]
+
+
+def data_inputs(tc):
+    """ :returns: indices and values of the rows of [tc] with data, which do not change if TestCampaign.fill_empty_data adds datasets or runs with zeros """
+    if tc not in Data.File or not len(Data.File[tc]):
+        return [b'']
+    d = Data[tc]
+    i = argwhere(d.any(axis=(2, 3)))
+    return [i, d[tuple(i.T)]]
 
 
 @update_pbar
-@pickle(use_args=True)
-def load_tc(tc, _redo=False):
+@cached(TCCache, name=str, key=tc_inputs)
+def read_tc(tc):
     return TestCampaign(tc)
 
 
-def load_tcs(redos=None):
-    info('loading test campaigns ...')
-    PBAR.start(len(TCStrings))
-    redos = {tc: False for tc in TCStrings} if redos is None else redos
-    return {tc: load_tc(tc, _redo=redo) for tc, redo in redos.items()}
+def load_tc(tc, _redo=False):
+    """ reads the TestCampaign [tc] from the cache or the inputs and indexes its DUTs """
+    return Index.add(read_tc(tc, _redo=_redo))
+
+
+def load_tcs(tcs=None, redo=False):
+    """ loads the test campaigns [tcs] (all by default) which are not loaded yet, instead of one by one at their first access """
+    tcs = [tc for tc in choose(tcs, TCStrings) if redo or not TestCampaigns.is_loaded(tc)]
+    if tcs:
+        info('loading test campaigns ...')
+        PBAR.start(len(tcs))
+        with Report.stage('load'):
+            for tc in tcs:
+                TestCampaigns[tc] = load_tc(tc, _redo=redo)
+    return TestCampaigns
 
 
 def reload_tcs():
-    global TestCampaigns
-    TestCampaigns = load_tcs({tc: True for tc in TCStrings})
+    load_tcs(redo=True)
 
 
 def make_bias_str(v):
@@ -453,80 +709,177 @@ def make_ev_str(v):
         return '?'
     n = int(log10(v) // 3)
     return f'{v / 10 ** (3 * n):.{1 if n > 1 else 0}f}{["", "k", "M"][n]}'
+
+
+def find_row_changes(old, new):
+    """ compares two arrays with shape (n_dut_slots, n_runs, 10, 2). Rows which only exist in one of them are treated as zeros.
+        :returns: list of (DUT slot, run number) of the rows which differ """
+    shape = maximum(old.shape, new.shape)
+    a, b = zeros(shape), zeros(shape)
+    a[tuple(slice(i) for i in old.shape)] = old
+    b[tuple(slice(i) for i in new.shape)] = new
+    return [(slot + 1, nr) for slot, nr in argwhere(((a != b) & ~(isnan(a) & isnan(b))).any(axis=(2, 3))).tolist()]
+
+
+def make_ev_strs(v):
+    """ vectorised version of make_ev_str for non-zero values """
+    with errstate(divide='ignore', invalid='ignore'):
+        n = (log10(where(v > 0, v, 1)) // 3).astype(int)
+    v = v / 10. ** (3 * n)
+    return char.add(where(n > 1, char.mod('%.1f', v), char.mod('%.0f', v)), array(['', 'k', 'M'])[n])
+
+
+def aggregate_runplans(data, rps):
+    """ aggregates the runs of all run plans [rps] at once with segment reductions over their concatenated run numbers.
+        The weighted mean of a value is missing if one of the runs has no uncertainty (no data), like the average with infinite weights.
+        :param data: array with shape (n_dut_slots, n_runs, 10, 2) of the test campaign
+        :returns: list of ([flux, cur, ph, ped, noise, pulph, pulsig, events] strings of each DUT, max flux of each DUT) for each run plan """
+    if not rps:
+        return []
+    starts = cumsum([0] + [rp.Size for rp in rps[:-1]])
+    d = data[:, concatenate([rp.RunNumbers for rp in rps])]
+    v, e, flux = d[..., 1:7, 0], d[..., 1:7, 1], d[..., 0, 0]
+    w = divide(1, e, out=zeros(e.shape), where=e != 0)
+    valid = logical_and.reduceat(e != 0, starts, axis=1)  # no run without uncertainty
+    sw = add.reduceat(w, starts, axis=1)
+    means = divide(add.reduceat(v * w, starts, axis=1), sw, out=full(sw.shape, nan), where=valid & (sw != 0))
+    lo, hi, events = minimum.reduceat(flux, starts, axis=1), maximum.reduceat(flux, starts, axis=1), add.reduceat(d[..., 9, 0], starts, axis=1)
+    flux_str = where(logical_and.reduceat(flux != 0, starts, axis=1), char.add(char.add(char.mod('%.0f', lo), ' ... '), char.mod('%.0f', hi)), '-').tolist()
+    means = where(isnan(means), '-', char.mod('%.1f', means)).tolist()
+    hi, events = hi.tolist(), events.tolist()
+    return [([[flux_str[i - 1][j], *means[i - 1][j], make_ev_str(events[i - 1][j])] for i in rp.DUTNrs], [hi[i - 1][j] for i in rp.DUTNrs]) for j, rp in enumerate(rps)]
+
+
+def make_data_strs(data):
+    """ formats the values of all runs of a test campaign at once, missing values are replaced by '-'.
+        :param data: array with shape (n_duts, n_runs, 10, 2) with values and uncertainties
+        :returns: array of strings with shape (n_duts, n_runs, 10): [flux, cur, ph, ped, noise, pulph, pulsig, pulped, pulnoi, events] """
+    form = [0, 1, 1, 1, 2, 1, 2, 2, 2]
+    is_u = [0, 1, 1, 0, 0, 1, 0, 0, 0]
+    v, e = data[..., 0], data[..., 1]
+    cols = []
+    for i, (f, u) in enumerate(zip(form, is_u)):
+        s = char.mod(f'%.{f}f', v[..., i])
+        if u:  # same format as the ufloats
+            s = char.add(char.add(s, '+/-'), where(e[..., i] == 0, '0', char.mod(f'%.{f}f', e[..., i])))
+        cols.append(where((v[..., i] == 0) & ((e[..., i] == 0) | (not u)), '-', s))
+    cols.append(where(v[..., 9] == 0, '-', make_ev_strs(v[..., 9])))
+    return stack(cols, axis=-1)
 # endregion INIT
 # ----------------------------------------
 
 
+# the model is only loaded at the first access, the server is only asked in update()
 RPDic = load_runplans()
-TCStrings = find_testcampaigns()  # init only strings
+TCStrings = find_local_testcampaigns()
 DUTs = load_duts()
 RunLogs = load_runlogs()
-TestCampaigns = load_tcs()
+TestCampaigns = LazyDict(TCStrings, load_tc)
 
 
 # ----------------------------------------
 # region UPDATE
 def update():
+    """ :returns: set of the changed inputs (see src.dependencies) """
+    global Synced
+    Synced = {}
     try:
-        reload_config()
-        return update_logs()
-    except CalledProcessError:
+        with Report.stage('sync'):
+            tcs = find_testcampaigns()
+            Synced = fetch_inputs(tcs)
+        with Report.stage('config'):
+            changed = reload_config()
+        with Report.stage('update'):
+            return update_logs(tcs, changed)
+    except (CalledProcessError, OSError):
         return warning('cannot connect to server ... ')
 
 
 def reload_config():
-    global Config, DUTParser
+    global Config, DUTParser, Sync
+    old_config, old_aliases = sections(Config), sections(DUTParser)
     Config = load_config()
-    copy_diamond_aliases()
     DUTParser = load_dut_parser()
+    Sync = load_sync()
+    return {dep.config(s) for s in find_changes(old_config, sections(Config))} | (set() if old_aliases == sections(DUTParser) else {dep.DUTS})
 
 
-def update_logs():
+def update_logs(tcs, changed=None):
     global TCStrings, TestCampaigns, RPDic, RunLogs, DUTs
-    TCStrings = find_testcampaigns()
-    new_runplans = copy_runplans()
+    changed = choose(changed, set())
+    old_tcs, old_rps, old_duts, loaded = TCStrings, RPDic, DUTs, TestCampaigns.loaded()
+    TCStrings = tcs
     RPDic = load_runplans()
-    new_runlogs = copy_runlogs()
     RunLogs = load_runlogs()
-    new_duts = copy_diamond_info()
     DUTs = load_duts()
-    reload = {tc: new_duts or new_runplans or new_runlog or (TestCampaigns[tc].has_new_data if tc in TestCampaigns else False) for tc, new_runlog in new_runlogs.items()}
-    if any(reload.values()):
-        TestCampaigns = load_tcs(reload)
-    return any(reload.values())
-
-
-def copy_from_server(server_file, local_file=None):
-    return 'to-chk' in str(check_output(f'rsync -aP {ServerName}:{server_file} {choose(local_file, Dir)}'.split()))
-
-
-def copy_runplans():
-    return copy_from_server(join(ServerSoft, 'Runinfos', 'run_plans.json'))
-
-
-def copy_diamond_info():
-    return copy_from_server(join(ServerSoft, 'Runinfos', 'dia_info.json'))
-
-
-def copy_diamond_aliases():
-    return copy_from_server(join(ServerSoft, 'config', 'DiamondAliases.ini'))
-
-
-@update_pbar
-def copy_runlog(tc):
-    return copy_from_server(server_file=join(f'{ServerData}', f'psi_{tc[:4]}_{tc[4:]}', 'run_log.json'), local_file=join(Dir, 'run_logs', f'{tc}.json'))
-
-
-def copy_runlogs():
-    info('copying run logs ...')
-    PBAR.start(len(TCStrings))
-    return {tc: copy_runlog(tc) for tc in TCStrings}
+    changed |= set() if old_tcs == TCStrings else {dep.TCS}
+    changed |= set() if list(old_duts) == list(DUTs) else {dep.DUTS}
+    changed |= {dep.dut(dut) for dut in find_changes({key: d.Specs for key, d in old_duts.items()}, {key: d.Specs for key, d in DUTs.items()})} if Synced.get('dia_info') else set()
+    loaded = {tc: c for tc, c in loaded.items() if tc in TCStrings}  # test campaigns which are not loaded yet are read from the new inputs anyway
+    for tc, c in loaded.items():
+        if Synced.get('run_plans'):
+            changed |= find_tc_changes(tc, old_rps.get(tc, {}), RPDic.get(tc, {}), dep.rp)
+        if Synced.get(tc):
+            changed |= find_tc_changes(tc, c.Log, RunLogs[tc], dep.run)
+    reload = {tc: dep.DUTS in changed or any(dep.get_tc(key) == tc for key in changed) or any(dep.dut(dut) in changed for dut in c.DUTs) for tc, c in loaded.items()}
+    new_data = {tc: c.find_new_data() for tc, c in loaded.items()} if Data.update() else {}  # only compare if the file changed
+    for tc, rows in new_data.items():
+        changed |= {dep.run(tc, nr) for slot, nr in rows}
+        if rows and not reload[tc]:
+            loaded[tc].update_data(rows)
+    TestCampaigns = LazyDict(TCStrings, load_tc, {tc: c for tc, c in loaded.items() if not reload[tc]})
+    synced = any(Synced.get(name) for name in ['run_plans', 'dia_info', 'aliases'])  # the saved DUT names of the test campaigns which are not loaded may be outdated
+    [Index.forget(tc) for tc in list(Index.load()) if tc not in TestCampaigns or reload.get(tc) or tc not in loaded and (synced or Synced.get(tc))]
+    redos = [tc for tc, redo in reload.items() if redo]
+    if redos:
+        load_tcs(redos)
+        changed |= set() if all(TestCampaigns[tc].DUTs == loaded[tc].DUTs and sorted(TestCampaigns[tc].runplan_duts) == sorted(loaded[tc].runplan_duts) for tc in redos) else {dep.DUTS}
+    return changed
+
+
+def sections(cfg):
+    return {section: dict(cfg[section]) for section in cfg.sections()}
+
+
+def find_changes(old, new):
+    """ :returns: keys which were added, removed or changed """
+    return [key for key in {**old, **new} if old.get(key) != new.get(key)]
+
+
+def find_tc_changes(tc, old, new, key):
+    """ :returns: changed run plans or runs of a test campaign. Added or removed items change the structure of the test campaign. """
+    changed = {key(tc, k) for k in find_changes(old, new)}
+    return changed | ({dep.tc(tc)} if set(old) != set(new) else set())
+
+
+def find_output_changes(paths):
+    """ :returns: keys of the runs and run plans whose linked analysis output (content/diamonds/dut/tc/run/*.html) was added or removed """
+    keys = set()
+    for path in paths:
+        parts = Path(path).relative_to(BaseDir.joinpath('content')).parts if str(path).startswith(str(BaseDir.joinpath('content'))) else ()
+        if len(parts) == 5 and parts[0] == 'diamonds' and parts[2] in TestCampaigns and parts[4].endswith('.html') and parts[4] != 'index.html':
+            tc, d = parts[2], parts[3]
+            keys |= {dep.run(tc, d)} if d.isdigit() else {dep.rp(tc, rp.Tag) for rp in TestCampaigns[tc].RunPlans if str(rp) == d}
+    return keys
+
+
+def fetch_inputs(tcs):
+    """ copies all inputs from the server with concurrent transfers.
+        :returns: {name: SyncResult}, where the run logs are named by their test campaign """
+    jobs = {name: (join(ServerSoft, 'Runinfos', f'{name}.json'), Dir) for name in ['run_plans', 'dia_info', 'selection']}
+    jobs['aliases'] = (join(ServerSoft, 'config', 'DiamondAliases.ini'), Dir)
+    jobs.update({tc: (join(ServerData, f'psi_{tc[:4]}_{tc[4:]}', 'run_log.json'), join(Dir, 'run_logs', f'{tc}.json')) for tc in tcs})
+    t = info(f'copying {len(jobs)} files from the server ...', endl=False)
+    results = dict(zip(jobs, Sync.fetch(jobs.values())))
+    r = sum(results.values(), sync.SyncResult())
+    add_to_info(t, f'{len(r.Files)} changed files, {r.Bytes / 1024:.1f} kB')
+    return results
 # endregion UPDATE
 # ----------------------------------------
 
 
 def get_rp_tcs():
-    return [tc.ID for tc in TestCampaigns.values() if tc.RunPlans]
+    return [tc for tc in TCStrings if RPDic.get(tc)]
 
 
 if __name__ == '__main__':
@@ -6,6 +6,8 @@
 from src.utils import join, remove_letters
 import src.html as html
 import src.info as data
+import src.dependencies as dep
+from src.dependencies import Graph
 
 
 class NavBar(html.File):
@@ -32,6 +34,7 @@ class NavBar(html.File):
         self.add_line(html.link(join('content', 'AmpBoards.html'), 'Amplifier Boards', colour=None), ind=1)
         self.add_line('</div>')
         self.save(add_root=False)
+        Graph.add(self.FileName, (self.build,), dep.config('General'), *[dep.tc(tc) for tc in data.TCStrings])
 
     @staticmethod
     def get(ind=2):
@@ -0,0 +1,44 @@
+# --------------------------------------------------------
+#       build pages in forked worker processes
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+from multiprocessing import get_context
+from src.utils import PBAR, ContentTree, Stats, Counter
+from src.dependencies import Graph
+from src.html import Manifest, Writer
+
+Task = None  # method which is executed in the workers, set before forking
+
+
+def run(f, items, n_workers=1):
+    """ calls the method [f] for every item. The workers are forked after the data model is loaded and share it read-only.
+        The dependencies, the written files, their digests and the counters of the workers are sent back, so the output is identical to the serial loop. """
+    items = list(items)
+    if n_workers < 2 or len(items) < 2:
+        return [f(item) for item in items]
+    global Task
+    Task = f
+    Writer.flush()  # no writer threads while forking
+    values = []
+    with get_context('fork').Pool(min(n_workers, len(items)), initializer=init_worker) as pool:
+        for value, pages, files, digests, stats in pool.imap(work, items):
+            Graph.load(f.__self__, pages)
+            [ContentTree.add(*file_) for file_ in files]
+            [Manifest.add(*d) for d in digests]
+            Stats.update(stats)
+            PBAR.update()
+            values.append(value)
+    return values
+
+
+def init_worker():
+    PBAR.PBar = None  # progress is reported by the parent process
+    Writer.reset()
+
+
+def work(item):
+    Graph.Added, ContentTree.Added, Manifest.Added, stats = [], [], [], Counter(Stats)
+    value = Task(item)
+    Writer.flush()
+    return value, Graph.export(Graph.Added), ContentTree.Added, Manifest.Added, Stats - stats
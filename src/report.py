@@ -0,0 +1,70 @@
+# --------------------------------------------------------
+#       timing and counters of the build stages
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+from contextlib import contextmanager
+from datetime import datetime
+from json import dumps
+from os import times
+from time import time
+from src.utils import Stats, Counter, BaseDir, info, choose, write_atomic
+
+Keys = ['pages', 'skipped', 'bytes', 'stat calls', 'cache hits', 'cache misses', 'row hits', 'row misses']
+
+
+def cpu_time():
+    """ :returns: user and system time of this process and of all finished worker processes """
+    t = times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class BuildReport:
+    """ Wall time, cpu time and the counters in utils.Stats for each stage of a build. Every build is appended as a json line to the report file,
+        which keeps the last builds only. Stages may be nested, their level is recorded. """
+
+    def __init__(self):
+        self.Stages = []
+        self.Info = {}
+        self.Start = None
+        self.Level = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} with {len(self.Stages)} stages'
+
+    def start(self, **kwargs):
+        self.Stages, self.Info, self.Start, self.Level = [], kwargs, (time(), cpu_time(), Counter(Stats)), 0
+
+    @contextmanager
+    def stage(self, name):
+        """ measures the enclosed code as stage [name] """
+        t, cpu, n = time(), cpu_time(), Counter(Stats)
+        i, self.Level = len(self.Stages), self.Level + 1
+        try:
+            yield
+        finally:
+            self.Level -= 1
+            self.Stages.insert(i, {'stage': name, 'level': self.Level, **self.measure(t, cpu, n)})
+
+    @staticmethod
+    def measure(t, cpu, n):
+        return {'wall': round(time() - t, 4), 'cpu': round(cpu_time() - cpu, 4), **{key: Stats[key] - n[key] for key in Keys}}
+
+    def to_dict(self, **kwargs):
+        start = choose(self.Start, (time(), cpu_time(), Counter(Stats)))
+        return {'time': datetime.fromtimestamp(start[0]).isoformat(timespec='seconds'), **self.Info, **kwargs, 'total': self.measure(*start), 'stages': self.Stages}
+
+    def save(self, filename, keep=1000, **kwargs):
+        """ appends the report of the current build to [filename] (relative to the base directory), which keeps the last [keep] reports """
+        d = self.to_dict(**kwargs)
+        if filename:
+            f = BaseDir.joinpath(filename)
+            lines = f.read_text().splitlines()[-keep + 1:] if f.is_file() and keep > 1 else []
+            f.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(f, '\n'.join(lines + [dumps(d), '']).encode())
+        total, slow = d['total'], ', '.join('{stage} ({wall:.2f} s)'.format(**s) for s in sorted([s for s in self.Stages if s['level'] == 0], key=lambda s: -s['wall'])[:3])
+        info(f'wrote {total["pages"]} pages ({total["bytes"] / 2 ** 20:.1f} MB), skipped {total["skipped"]} unchanged pages in {total["wall"]:.2f} s, slowest stages: {slow}')
+        return d
+
+
+Report = BuildReport()
@@ -6,10 +6,83 @@
 from src.utils import *
 import src.html as html
 import src.info as data
+import src.dependencies as dep
+from src.dependencies import Graph
+import src.parallel as parallel
 from operator import itemgetter
+from pickle import dumps as pdumps
 from typing import Any
 
 
+class RowCache:
+    """ Rendered rows of the run tables, which are only rendered again if the data of the run or the files in its directory changed.
+        The rows of each test campaign and table are kept in memory between the builds and in a pickle file, which is reloaded if a worker process changed it.
+        All rows are rendered again if the code or the html settings (see version) changed. """
+
+    Code = Cache.digest(*[Path(f).read_bytes() for f in [__file__, join(BaseDir, 'src', 'html.py')]])
+
+    def __init__(self, path):
+        self.Dir = Path(path)
+        self.Tables = {}  # {(tc, table): [signature of the file, {key: (state, html)}]}
+        self.Changed = set()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} of {len(self.Tables)} tables with {sum(len(rows) for sig, rows in self.Tables.values())} rows'
+
+    def path(self, tc, table):
+        return self.Dir.joinpath(f'{table}-{tc}.pickle')
+
+    @staticmethod
+    def version():
+        """ :returns: the code and the html settings which change the rendered rows """
+        return RowCache.Code, html.Minify
+
+    def signature(self, tc, table):
+        Stats['stat calls'] += 1
+        try:
+            s = stat(self.path(tc, table))
+            return self.version(), s.st_mtime_ns, s.st_size
+        except FileNotFoundError:
+            return self.version(), None
+
+    def open(self, tc, table):
+        """ loads the rows of [tc] and [table] if they are not in memory or the file or the version changed """
+        sig = self.signature(tc, table)
+        if (tc, table) not in self.Tables or self.Tables[(tc, table)][0] != sig:
+            self.Tables[(tc, table)] = [sig, self.load(tc, table)]
+
+    def load(self, tc, table):
+        try:
+            with open(self.path(tc, table), 'rb') as f:
+                version, rows = pload(f)
+            return rows if version == self.version() else {}
+        except (OSError, EOFError, UnpicklingError, ValueError):
+            return {}
+
+    def get(self, tc, table, key, state, f, *args):
+        """ :returns: the cached html of the row [key] if its [state] did not change, otherwise f(*args) """
+        if state is None:
+            return f(*args)
+        rows = self.Tables[(tc, table)][1]
+        if key in rows and rows[key][0] == state:
+            Stats['row hits'] += 1
+            return rows[key][1]
+        Stats['row misses'] += 1
+        rows[key] = state, f(*args)
+        self.Changed.add((tc, table))
+        return rows[key][1]
+
+    def save(self, tc, table):
+        if (tc, table) in self.Changed:
+            self.Dir.mkdir(parents=True, exist_ok=True)
+            write_atomic(self.path(tc, table), pdumps((self.version(), self.Tables[(tc, table)][1]), HIGHEST_PROTOCOL))
+            self.Tables[(tc, table)][0] = self.signature(tc, table)
+            self.Changed.discard((tc, table))
+
+
+Rows = RowCache(join(BaseDir, 'data', 'metadata', 'rows'))
+
+
 class RunTables(html.File):
 
     def __init__(self, website):
@@ -30,17 +103,32 @@ class RunTables(html.File):
     def build_all(self):
         info('creating run tables for runplans')
         PBAR.start(len(data.TestCampaigns), counter=True)
-        [self.build_tc(tc) for tc in data.TestCampaigns]
+        parallel.run(self.build_tc, data.TestCampaigns, self.Website.Workers)
 
     @update_pbar
     @quiet
     def build_tc(self, tc):
         tc = data.TestCampaigns[tc]
-        run_table = lambda run, i: PixRunTable if 'pixel' in tc.DUTTypes[run.DUTs[i]] else PadRunTable
-        rows = {run.Number: [run_table(run, i).row(self.rlink, run, i) for i in range(run.NDUTs)] for run in tc.runplan_runs}  # only create rows once ...
+        rows = self.rows(tc, tc.runplan_runs)  # only create rows once ...
         for rp in tc.RunPlans:
             for i in range(rp.NDUTs):
-                self.get_run_table(rp).build(rp, i, rows=RunTable.rowgetter(rp, i)(rows))
+                self.build_rp(tc.ID, rp.Tag, i, rows)
+
+    def build_rp(self, tc, tag, dut_nr, rows=None):
+        rp = data.TestCampaigns[tc].get_runplan(tag)
+        rows = self.rows(data.TestCampaigns[tc], [data.TestCampaigns[tc].Runs[nr] for nr in rp.RunNumbers]) if rows is None else rows
+        run_table = self.get_run_table(rp)
+        run_table.build(rp, dut_nr, rows=RunTable.rowgetter(rp, dut_nr)(rows))
+        Graph.add(run_table.FileName, (self.build_rp, tc, tag, dut_nr), dep.rp(tc, tag), dep.dut(rp.DUTs[dut_nr]), *[dep.run(tc, nr) for nr in rp.RunNumbers])
+
+    def rows(self, tc: data.TestCampaign, runs):
+        """ :returns: {run number: rendered row of each DUT}, the unchanged rows are taken from the RowCache """
+        run_table = lambda run, i: PixRunTable if 'pixel' in tc.DUTTypes[run.DUTs[i]] else PadRunTable
+        Rows.open(tc.ID, 'runs')
+        rows = {run.Number: [Rows.get(tc.ID, 'runs', (run.Number, i), run_table(run, i).state(run, i), run_table(run, i).html_row, self.rlink, run, i) for i in range(run.NDUTs)]
+                for run in runs}
+        Rows.save(tc.ID, 'runs')
+        return rows
 
     def rlink(self, d, htmlname, target, **kwargs):
         return self.link(join(d, f'{htmlname}.html'), target, **prep_kw(kwargs, new_tab=True, colour=None))
@@ -59,7 +147,7 @@ class RunTable(html.File):
         self.set_filename(rp.RelDirs[dut_nr], 'index.html')
         self.set_header(self.Website.get_header(f'{rp.DUTs[dut_nr].Name} {rp.ShortName}'))
         rows = self.rows(self.rlink, rp, dut_nr) if rows is None else rows
-        self.set_body('\n'.join([self.Website.NavBar.get(), html.table(self.title(rp, dut_nr), self.header, rows)]))
+        self.set_body([self.Website.NavBar.get(), html.table(self.title(rp, dut_nr), self.header, rows)])
         self.save()
 
     @property
@@ -83,6 +171,16 @@ class RunTable(html.File):
         row += [f(d, n, html.fig_icon()) for n in ['HitMap', 'SignalDistribution', 'SignalMap2D']]
         return row + cls.add2row(f, d, values) + [values[9], run.StartTime, run.Duration, (run.Comment[:10], html.style(left=True))]
 
+    @classmethod
+    def html_row(cls, f, run: data.Run, dut_nr):
+        return html.table_row(cls.row(f, run, dut_nr))
+
+    @classmethod
+    def state(cls, run: data.Run, dut_nr):
+        """ :returns: everything the row depends on, including the files in the run directory (targets of the links), None if it cannot be cached """
+        files = ContentTree.listing(run.RelDirs[dut_nr])
+        return None if files is None else (cls.__name__, run.RelDirs[dut_nr], files, run.Biases[dut_nr], tuple(run.FullData[dut_nr]), run.StartTime, run.Duration, run.Comment)
+
     @staticmethod
     def add2row(f, d, values):
         return []
@@ -131,18 +229,21 @@ class FullRunTable(html.File):
 
     @update_pbar
     def build(self, tc):
+        """ saves the runs of [tc] in pages of at most html.PageSize rows, the rows of a run are kept together """
         tc = data.TestCampaigns[tc]
-        self.set_filename(join(self.Dir, tc.ID, 'index.html'))
-        self.set_header(self.Website.get_header(f'Runs {tc}'))
-        self.set_body('\n'.join([self.Website.NavBar.get(), html.table(self.title(tc), self.header, self.body(tc))]))
-        self.save()
+        runs, groups = list(tc.Runs.values()), self.body(tc)
+        pages = html.paginate([len(rows) for rows in groups])
+        for i, (s, e) in enumerate(pages):
+            self.set_filename(join(self.Dir, tc.ID, html.page_name(i)))
+            self.set_header(self.Website.get_header(f'Runs {tc}'))
+            self.save_pages(i, len(pages), self.Website.NavBar.get(), html.table(self.title(tc), self.header, [row for rows in groups[s:e] for row in rows]))
+            Graph.add(self.FileName, (self.build, tc.ID), dep.tc(tc.ID), *[dep.run(tc.ID, run.Number) for run in runs[s:e]])
 
     @quiet
     def build_all(self):
         info('creating single run tables ...')
         PBAR.start(len(data.TestCampaigns), counter=True)
-        for tc in data.TestCampaigns:
-            self.build(tc)
+        parallel.run(self.build, data.TestCampaigns, self.Website.Workers)
 
     @staticmethod
     def title(tc: data.TestCampaign):
@@ -155,10 +256,23 @@ class FullRunTable(html.File):
                 'Comments']
 
     def body(self, tc: data.TestCampaign):
+        """ :returns: rendered rows of each run """
+        Rows.open(tc.ID, 'full')
+        rows = [Rows.get(tc.ID, 'full', run.Number, self.state(run), self.rows, run) for run in tc.Runs.values()]
+        Rows.save(tc.ID, 'full')
+        return rows
+
+    def rows(self, run: data.Run):
+        """ :returns: rendered rows of all DUTs of the [run] """
         rows = []
-        for run in tc.Runs.values():
-            for i in range(run.NDUTs):
-                row = [] if i else [(v, *html.opts(rs=run.NDUTs)) for v in [run.Number, run.Type, run.FS11, run.FS13, run.EventStr, run.StartTime, run.Duration]]
-                row += [(run.DUTs[i], html.style(nowrap=True)), self.link(join(run.RelDirs[i], 'plots.html'), html.LinkIcon, use_name=False), data.make_bias_str(run.Biases[i])] + run.get_short_data(i)
-                rows.append(row + ([] if i else [(run.Comment, html.style(left=True), *html.opts(rs=run.NDUTs))]))
+        for i in range(run.NDUTs):
+            row = [] if i else [(v, *html.opts(rs=run.NDUTs)) for v in [run.Number, run.Type, run.FS11, run.FS13, run.EventStr, run.StartTime, run.Duration]]
+            row += [(run.DUTs[i], html.style(nowrap=True)), self.link(join(run.RelDirs[i], 'plots.html'), html.LinkIcon, use_name=False), data.make_bias_str(run.Biases[i])] + run.get_short_data(i)
+            rows.append(html.table_row(row + ([] if i else [(run.Comment, html.style(left=True), *html.opts(rs=run.NDUTs))])))
         return rows
+
+    @staticmethod
+    def state(run: data.Run):
+        files = [ContentTree.listing(d) for d in run.RelDirs]
+        if None not in files:
+            return run.Type, run.FS11, run.FS13, run.EventStr, run.StartTime, run.Duration, run.Comment, *zip(run.DUTs, run.RelDirs, files, run.Biases, map(tuple, run.FullData))
@@ -0,0 +1,151 @@
+# --------------------------------------------------------
+#       columnar store of the run logs
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+from collections.abc import Mapping
+from json import dumps
+from os import replace, stat
+from re import compile as re_compile
+from tempfile import NamedTemporaryFile
+from numpy import array, zeros, datetime64, load as npload, save as npsave
+from src.utils import load_json, isfile, Path
+
+Version = 1
+Missing, Int, Float, Table, Time = range(5)  # kinds of the values
+TimeFormat = re_compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ')
+
+
+class Record(Mapping):
+    """ Read-only view of a single run of a RunLog, which behaves like the dictionary of the json run log. """
+
+    __slots__ = ['Log', 'I']
+
+    def __init__(self, log, i):
+        self.Log = log
+        self.I = i
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __getitem__(self, key):
+        return self.Log.value(key, self.I)
+
+    def __iter__(self):
+        return (key for key, (v, t) in self.Log.Columns.items() if t[self.I])
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class RunLog(Mapping):
+    """ Run log of a test campaign with the run numbers (str) as keys and a Record for each run.
+        The json run log is converted once into columns, where each value is stored as float together with its kind. Strings are interned in a table,
+        time stamps are stored as seconds since the epoch. The columns are saved as .npy file, which is memory-mapped on load, next to a json file
+        with the run numbers, the keys and the string table. The conversion is repeated if the json file changed. """
+
+    def __init__(self, filename, store):
+        self.FileName = Path(filename)
+        self.Store = Path(store).joinpath(self.FileName.stem)
+        meta, self.Data = self.open()
+        self.Runs, self.Keys, self.Table = meta['runs'], meta['keys'], meta['table']
+        self.Index = {nr: i for i, nr in enumerate(self.Runs)}
+        self.Columns = self.make_columns()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} of {self.FileName.name} with {len(self)} runs and {len(self.Keys)} keys'
+
+    def __getitem__(self, nr):
+        return Record(self, self.Index[str(nr)])
+
+    def __iter__(self):
+        return iter(self.Runs)
+
+    def __len__(self):
+        return len(self.Runs)
+
+    def __getstate__(self):
+        return {'FileName': self.FileName, 'Store': self.Store.parent}  # the store is memory-mapped again instead of pickling the values
+
+    def __setstate__(self, state):
+        self.__init__(state['FileName'], state['Store'])
+
+    # ----------------------------------------
+    # region STORE
+    def signature(self):
+        if not isfile(self.FileName):
+            return None
+        s = stat(self.FileName)
+        return [s.st_mtime_ns, s.st_size]
+
+    def open(self):
+        """ :returns: meta data and the memory-mapped columns, the json run log is converted if the store is missing or outdated """
+        meta = load_json(self.Store.with_suffix('.json'))
+        if meta.get('version') != Version or meta.get('source') != self.signature() or not isfile(self.Store.with_suffix('.npy')):
+            meta = self.ingest()
+        return meta, npload(self.Store.with_suffix('.npy'), mmap_mode='r')
+
+    def ingest(self):
+        """ converts the json run log into the columnar store. :returns: the meta data """
+        sig, log = self.signature(), load_json(self.FileName)
+        keys, table, codes = list(dict.fromkeys(key for d in log.values() for key in d)), [], {}
+        d = zeros(len(log), [(f'{c}{i}', typ) for i in range(len(keys)) for c, typ in [('v', 'f8'), ('t', 'i1')]])
+        for i, key in enumerate(keys):
+            d[f'v{i}'], d[f't{i}'] = zip(*[encode(run[key], table, codes) if key in run else (0., Missing) for run in log.values()])
+        meta = {'version': Version, 'source': sig, 'runs': list(log), 'keys': keys, 'table': table}
+        self.Store.parent.mkdir(parents=True, exist_ok=True)
+        for suffix, save in [('.npy', lambda f: npsave(f, d)), ('.json', lambda f: f.write(dumps(meta).encode()))]:  # json last, it validates the store
+            with NamedTemporaryFile('wb', dir=self.Store.parent, suffix='.tmp', delete=False) as f:
+                save(f)
+            replace(f.name, self.Store.with_suffix(suffix))
+        return meta
+
+    def make_columns(self):
+        return {key: (self.Data[f'v{i}'], self.Data[f't{i}']) for i, key in enumerate(self.Keys)}
+    # endregion STORE
+    # ----------------------------------------
+
+    def decode(self, v, t):
+        return int(v) if t == Int else v if t == Float else self.Table[int(v)] if t == Table else f'{datetime64(int(v), "s")}Z'
+
+    def value(self, key, i):
+        v, t = self.Columns[key]
+        if not t[i]:
+            raise KeyError(key)
+        return self.decode(v[i].item(), t[i])
+
+    def column(self, key, nrs=None, default=None):
+        """ :returns: list of the values of [key] for the runs [nrs] (all by default), [default] for the runs without the key """
+        idx = slice(None) if nrs is None else [self.Index[str(nr)] for nr in nrs]
+        if key not in self.Columns:
+            return [default] * (len(self.Runs) if nrs is None else len(idx))
+        v, t = self.Columns[key]
+        return [default if tt == Missing else self.decode(vv, tt) for vv, tt in zip(v[idx].tolist(), t[idx].tolist())]
+
+    def times(self, key, nrs=None):
+        """ :returns: array of the time stamps of [key] for the runs [nrs] (all by default) as seconds since the epoch """
+        idx = slice(None) if nrs is None else [self.Index[str(nr)] for nr in nrs]
+        v, t = (c[idx] for c in self.Columns[key])
+        if (t == Time).all():
+            return v.astype('i8')
+        return array([s.rstrip('Z') for s in self.column(key, nrs)], 'datetime64[s]').astype('i8')
+
+
+def encode(value, table, codes):
+    """ :returns: value as float and its kind. Strings and other values are added to the [table] once. """
+    if type(value) is int and abs(value) < 2 ** 53:
+        return float(value), Int
+    if type(value) is float:
+        return value, Float
+    if type(value) is str and TimeFormat.fullmatch(value):
+        try:
+            t = datetime64(value[:-1], 's')
+            if f'{t}Z' == value:
+                return float(t.astype('i8')), Time
+        except ValueError:
+            pass
+    key = dumps(value, sort_keys=True)
+    if key not in codes:
+        codes[key] = len(table)
+        table.append(value)
+    return float(codes[key]), Table
@@ -6,6 +6,9 @@
 from src.utils import *
 import src.html as html
 import src.info as data
+import src.dependencies as dep
+from src.dependencies import Graph
+import src.parallel as parallel
 
 
 class RunPlanTable(html.File):
@@ -19,14 +22,15 @@ class RunPlanTable(html.File):
         if tc.RunPlans:
             self.set_filename(BaseDir, 'content', 'beamtests', tc.ID, 'RunPlans.html')
             self.set_header(self.Website.get_header(f'Run Plans {tc}'))
-            self.set_body('\n'.join([self.Website.NavBar.get(), html.table(self.title(tc), self.header(tc), self.body(tc), html.style(nowrap=True))]))
+            self.set_body([self.Website.NavBar.get(), html.table(self.title(tc), self.header(tc), self.body(tc), html.style(nowrap=True))])
             self.save()
+            runs = [dep.run(tc.ID, nr) for rp in tc.RunPlans for nr in rp.RunNumbers]  # the events, biases and durations come from the run logs
+            Graph.add(self.FileName, (self.build, tc.ID), dep.tc(tc.ID), *[dep.rp(tc.ID, rp.Tag) for rp in tc.RunPlans], *[dep.dut(dut) for dut in tc.runplan_duts], *runs)
 
     @quiet
     def build_all(self):
         info('creating runplan tables for beam tests ...')
-        for tc in data.TestCampaigns:
-            self.build(tc)
+        parallel.run(self.build, data.TestCampaigns, self.Website.Workers)
 
     @staticmethod
     def title(tc: data.TestCampaign):
@@ -41,7 +45,7 @@ class RunPlanTable(html.File):
     def body(self, tc: data.TestCampaign):
         rows = []
         for rp in tc.RunPlans:
-            row = [(v, *html.opts(rs=rp.NSub)) for v in [rp.Tag, rp.Digitiser, rp.Amplifier, rp.DUTType]] if rp.IsMain else []
+            row = [(v, *html.opts(rs=tc.get_nsub(rp))) for v in [rp.Tag, rp.Digitiser, rp.Amplifier, rp.DUTType]] if rp.IsMain else []
             row += [(rp.Tag.lstrip('0'), html.style(colour=html.Good if rp.is_complete else None)), rp.Type, rp.RunStr, rp.EventStr]
             row += [w for i, dut in enumerate(rp.DUTs) for w in [self.link(rp.RelDirs[i], html.LinkIcon), self.link(join(dut.RelDir, tc.ID), dut.Name), rp.BiasStr[i]]]
             rows.append(row)
@@ -75,35 +79,43 @@ class DiaRunPlanTable(html.File):
     @quiet
     def build_all(self):
         info('creating runplan tables for DUTs ...')
-        duts = [dut for dut in data.DUTs.values() if dut.rp_tcs]
+        duts = [dut.Name for dut in data.DUTs.values() if dut.rp_tcs]
         PBAR.start(len(duts), counter=True)
-        for dut in duts:
-            self.build(dut)
+        parallel.run(self.build, duts, self.Website.Workers)
 
     @update_pbar
-    def build(self, dut: data.DUT):
-        tc_bodies = {tc: self.build_dut_tc(data.TestCampaigns[tc], dut) for tc in dut.tcs}
-        if tc_bodies and sum(len(r) for r in tc_bodies.values()):
-            self.set_filename(dut.Dir, 'index.html')
-            self.set_header(self.Website.get_header(f'Run Plans - {dut.Name}'))
-            self.set_body('\n'.join([self.Website.NavBar.get(), html.table(self.title(dut), self.MainHeader, self.body(dut, tc_bodies))]))
-            self.save()
-
-    def build_dut_tc(self, tc: data.TestCampaign, dut: data.DUT):
+    def build(self, dut):
+        """ saves the run plans of [dut] in pages of at most html.PageSize rows, the run plans of a beam test are kept together """
+        dut = data.DUTs[dut]
+        tc_bodies = {tc: self.build_dut_tc(tc, dut.Name) for tc in dut.tcs}
+        tc_bodies = {tc: rows for tc, rows in tc_bodies.items() if rows}
+        if tc_bodies:
+            tcs, groups = list(tc_bodies), self.body(dut, tc_bodies)
+            pages = html.paginate([len(rows) for rows in groups])
+            for i, (s, e) in enumerate(pages):
+                self.set_filename(dut.Dir, html.page_name(i))
+                self.set_header(self.Website.get_header(f'Run Plans - {dut.Name}'))
+                self.save_pages(i, len(pages), self.Website.NavBar.get(), html.table(self.title(dut), self.MainHeader, [row for rows in groups[s:e] for row in rows]))
+                rps = [key for tc in tcs[s:e] for rp in data.TestCampaigns[tc].get_dut_runplans(dut) for key in [dep.rp(tc, rp.Tag), *[dep.run(tc, nr) for nr in rp.RunNumbers]]]
+                Graph.add(self.FileName, (self.build, dut.Name), dep.dut(dut), *[dep.tc(tc) for tc in tcs[s:e]], *rps)
+
+    def build_dut_tc(self, tc, dut):
+        tc, dut = data.TestCampaigns[tc], data.DUTs[dut]
         self.set_filename(dut.Dir, tc.ID, 'index.html')
         self.set_header(self.Website.get_header(f'Run Plans - {dut} ({tc})'))
-        rows = [self.row(rp, rp.get_dut_nr(dut)) for rp in tc.get_dut_runplans(dut)]
+        rows = [self.row(tc, rp, rp.get_dut_nr(dut)) for rp in tc.get_dut_runplans(dut)]
         if not rows:
             return []
-        self.set_body('\n'.join([self.Website.NavBar.get(), html.table(self.tc_title(tc, dut), self.TCHeader, rows, html.style(nowrap=True))]))
+        self.set_body([self.Website.NavBar.get(), html.table(self.tc_title(tc, dut), self.TCHeader, rows, html.style(nowrap=True))])
         self.save()
+        rps = [key for rp in tc.get_dut_runplans(dut) for key in [dep.rp(tc.ID, rp.Tag), *[dep.run(tc.ID, nr) for nr in rp.RunNumbers]]]
+        Graph.add(self.FileName, (self.build_dut_tc, tc.ID, dut.Name), dep.tc(tc.ID), dep.dut(dut), *rps)
         return rows
 
     @quiet
     def build_tc(self, tc):
         """ only builds the runplan tables for a single beam test. """
-        tc = data.TestCampaigns[tc]
-        [self.build_dut_tc(tc, data.DUTs[name]) for name in tc.DUTs]
+        [self.build_dut_tc(tc, name) for name in data.TestCampaigns[tc].DUTs]
 
     def tc_title(self, tc: data.TestCampaign, dut: data.DUT):
         return f'Run Plans for {self.link(dut.RelDir, str(dut))} in {tc}'
@@ -112,28 +124,28 @@ class DiaRunPlanTable(html.File):
     def title(dut: data.DUT):
         return f'Run Plans for {dut}'
 
-    def row(self, rp: data.RunPlan, i):
+    def row(self, tc: data.TestCampaign, rp: data.RunPlan, i):
         figs = ['FluxProfile', 'Currents', ('PH', 'PulseHeightFlux'), ('Ped', 'PedestalFlux'), ('Noise', 'NoiseFlux'), 'PulserPH', 'PulserSigma']
-        row = [(v, *html.opts(rs=rp.NSub)) for v in [rp.Tag, rp.Positions[i], rp.Digitiser, rp.Amplifier, *rp.get_attenuators(i), rp.BiasStr[i]]] if rp.IsMain else []
+        row = [(v, *html.opts(rs=tc.get_nsub(rp))) for v in [rp.Tag, rp.Positions[i], rp.Digitiser, rp.Amplifier, *rp.get_attenuators(i), rp.BiasStr[i]]] if rp.IsMain else []
         row += [self.link(join(rp.RelDirs[i], 'plots.html'), rp.Tag.lstrip('0')), self.link(rp.RelDirs[i], rp.RunStr)]
         row += [self.rplink_(rp.RelDirs[i], fig, rp.DataStr[i][j]) for j, fig in enumerate(figs)]
         return row + [rp.DataStr[i][-1], rp.StartTime, rp.Duration]
 
     @staticmethod
     def body(dut: data.DUT, tc_rows):
-        """ Add tc info and irrad to the first row"""
+        """ Add tc info and irrad to the first row. :returns: rows of each test campaign """
         all_rows = []
         for tc, rows in tc_rows.items():
             if rows:
                 tc_info = f'{html.link(join(dut.RelDir, tc), data.TestCampaign.to_str(tc, short=False))}<br><br>({dut.get_type(tc)}{f",<br>pulser: {dut.get_pulser(tc)})" if dut.get_pulser(tc) else ")"}'
                 rows[0] = [(n, *html.opts(rs=len(rows))) for n in [tc_info, html.irr2str(dut.get_irradiation(tc))]] + rows[0]
                 rows[-1] = (rows[-1], html.style(hline='1px solid'))
-                all_rows += rows
+                all_rows.append(rows)
         return all_rows
 
     def rplink_(self, d, htmlname, target, **kwargs):
         n = [Path(d).joinpath(i).with_suffix('.html') for i in make_list(htmlname)]
-        return self.link(next(filter(lambda x: BaseDir.joinpath(x).exists(), n), n[-1]), target, **prep_kw(kwargs, new_tab=True, colour=None))
+        return self.link(next(filter(ContentTree.exists, n), n[-1]), target, **prep_kw(kwargs, new_tab=True, colour=None))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,235 @@
+# --------------------------------------------------------
+#       schedules the builds of the website daemon
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+from abc import ABC, abstractmethod
+from ctypes import CDLL, get_errno
+from ctypes.util import find_library
+from os import walk, read, pipe, close, set_blocking, stat
+from os.path import isdir, join
+from pathlib import Path
+from select import select
+from signal import signal, SIGINT, SIGTERM, set_wakeup_fd
+from struct import unpack_from
+from time import time
+from src.utils import info, warning, print_banner, get_elapsed_time, BaseDir, ContentTree
+import src.info as data
+import src.html as html
+
+
+class Watcher(ABC):
+    """ Base class of the file watchers. wait() returns the changed files as soon as there are any, after the timeout or when the wake-up fd is written. """
+
+    def __init__(self, paths, exclude=(), wake=None):
+        self.Paths = [str(p) for p in paths if isdir(p)]
+        self.Exclude = [str(p) for p in exclude]
+        self.Wake = wake
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} of {", ".join(self.Paths)}'
+
+    def is_excluded(self, path):
+        return any(path == e or path.startswith(f'{e}/') for e in self.Exclude)
+
+    def walk(self, path):
+        """ :returns: generator of (directory, file names) of all directories which are not excluded """
+        for d, dirs, files in walk(path, followlinks=True):
+            dirs[:] = [name for name in dirs if not self.is_excluded(join(d, name))]
+            yield d, files
+
+    def sleep(self, timeout, fds=()):
+        """ :returns: the ready file descriptors or None if the wake-up fd was written """
+        ready = select([*fds] + ([] if self.Wake is None else [self.Wake]), [], [], max(0., timeout))[0]
+        if self.Wake in ready:
+            while True:
+                try:
+                    read(self.Wake, 512)
+                except BlockingIOError:
+                    return None
+        return ready
+
+    @abstractmethod
+    def wait(self, timeout):
+        """ :returns: set of the changed files """
+
+    def close(self):
+        pass
+
+
+class INotify(Watcher):
+    """ Linux file system notifications. All subdirectories are watched as well. """
+
+    Mask = 0x8 | 0x40 | 0x80 | 0x100 | 0x200  # IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    IsDir, Overflow = 0x40000000, 0x4000
+
+    def __init__(self, paths, exclude=(), wake=None):
+        super().__init__(paths, exclude, wake)
+        self.Lib = CDLL(find_library('c'), use_errno=True)
+        self.FD = self.Lib.inotify_init1(0o4000 | 0o2000000)  # IN_NONBLOCK | IN_CLOEXEC
+        if self.FD < 0:
+            raise OSError(get_errno(), 'cannot initialise inotify')
+        self.Dirs = {}  # watch descriptor -> directory
+        [self.watch(path) for path in self.Paths]
+
+    def watch(self, path):
+        """ watches [path] and all its subdirectories. :returns: the files which already exist in them """
+        files = []
+        for d, names in self.walk(path):
+            wd = self.Lib.inotify_add_watch(self.FD, d.encode(), self.Mask)
+            if wd < 0:
+                warning(f'cannot watch {d} (errno {get_errno()})')
+            self.Dirs[wd] = d
+            files += [join(d, name) for name in names]
+        return files
+
+    def read(self):
+        changed = set()
+        while True:
+            try:
+                buf = read(self.FD, 1 << 16)
+            except BlockingIOError:
+                return changed
+            i = 0
+            while i < len(buf):
+                wd, mask, cookie, n = unpack_from('iIII', buf, i)
+                name, i = buf[i + 16:i + 16 + n].rstrip(b'\0').decode(), i + 16 + n
+                if mask & INotify.Overflow:  # events were lost, so report all files
+                    changed |= {join(d, f) for path in self.Paths for d, files in self.walk(path) for f in files}
+                elif wd in self.Dirs:
+                    path = join(self.Dirs[wd], name)
+                    if not mask & INotify.IsDir:
+                        changed.add(path)
+                    elif mask & (0x80 | 0x100) and not self.is_excluded(path):  # new directories are watched and their files reported
+                        changed |= set(self.watch(path))
+
+    def wait(self, timeout):
+        return self.read() if self.sleep(timeout, [self.FD]) else set()
+
+    def close(self):
+        close(self.FD)
+
+
+class StatWatcher(Watcher):
+    """ Compares snapshots of the modification times, if no file system notifications are available. """
+
+    def __init__(self, paths, exclude=(), wake=None, interval=2.):
+        super().__init__(paths, exclude, wake)
+        self.Interval = interval
+        self.Snapshot = self.scan()
+
+    def scan(self):
+        s = {}
+        for path in self.Paths:
+            for d, files in self.walk(path):
+                for name in files:
+                    try:
+                        st = stat(join(d, name))
+                        s[join(d, name)] = st.st_mtime_ns, st.st_size
+                    except FileNotFoundError:
+                        pass
+        return s
+
+    def wait(self, timeout):
+        end = time() + timeout
+        while True:
+            if self.sleep(min(self.Interval, end - time())) is None:
+                return set()
+            new, old = self.scan(), self.Snapshot
+            self.Snapshot = new
+            changed = {path for path in new.keys() | old.keys() if new.get(path) != old.get(path)}
+            if changed or time() >= end:
+                return changed
+
+
+def make_watcher(paths, exclude=(), wake=None):
+    try:
+        return INotify(paths, exclude, wake)
+    except (OSError, AttributeError):  # no inotify on this platform
+        return StatWatcher(paths, exclude, wake)
+
+
+class Scheduler:
+    """ Runs the website as daemon. A build is started when watched files change or the server is polled. The poll interval is reset after activity
+        and doubled while it is idle. Bursts of changes are collected into a single build. SIGINT or SIGTERM stop the daemon after the current build. """
+
+    def __init__(self, website, tc=None):
+        self.Website = website
+        self.TC = tc
+        self.MinInterval = website.Config.get_value('Daemon', 'min interval', default=10.)
+        self.MaxInterval = website.Config.get_value('Daemon', 'max interval', default=600.)
+        self.Quiet = website.Config.get_value('Daemon', 'quiet time', default=2.)
+        self.MaxDelay = website.Config.get_value('Daemon', 'max delay', default=30.)
+        self.Count = 0
+        self.StartTime = time()
+        self.Stopped = False
+
+    def stop(self, *args):
+        if self.Stopped:
+            raise KeyboardInterrupt
+        self.Stopped = True
+        info('stopping after the current build (send again to abort) ...')
+
+    def paths(self):
+        """ :returns: watched directories and the excluded ones, the run logs are only copied from the server by the website itself """
+        paths = [data.Dir, BaseDir.joinpath('content', 'diamonds')] + ([data.Sync.Dir] if isinstance(data.Sync, data.sync.LocalBackend) else [])
+        return paths, [join(data.Dir, 'metadata'), join(data.Dir, 'run_logs')]
+
+    @staticmethod
+    def is_input(path):
+        """ :returns: whether [path] was written by the analysis or on the server. The website writes its pages (with the compressed siblings),
+            temporary files and the copies of the server files next to the data file, which would start another build right away. """
+        p = Path(path)
+        if p.suffix == '.tmp' or p.suffix[1:] in html.Compress or str(p) in html.Manifest.load():
+            return False
+        return p.parent != Path(data.Dir) or p.name == Path(data.Data.FileName).name
+
+    def run(self):
+        r, w = pipe()
+        set_blocking(r, False)
+        set_blocking(w, False)
+        handlers, wake_fd = [signal(s, self.stop) for s in [SIGINT, SIGTERM]], set_wakeup_fd(w)
+        watcher = make_watcher(*self.paths(), wake=r)
+        try:
+            interval, changed = self.MinInterval, set()
+            while not self.Stopped:
+                print_banner(f'starting iteration ({self.Count:04d}), running for {get_elapsed_time(self.StartTime, hrs=True)}', color='red')
+                active = self.build(changed)
+                self.Count += 1
+                interval = self.MinInterval if active else min(2 * interval, self.MaxInterval)
+                changed = self.wait(watcher, interval)
+        finally:
+            watcher.close()
+            set_wakeup_fd(wake_fd)
+            [signal(s, h) for s, h in zip([SIGINT, SIGTERM], handlers)]
+            [close(fd) for fd in [r, w]]
+        info(f'stopped after {self.Count} builds')
+
+    def wait(self, watcher, timeout):
+        """ :returns: changed files after the timeout or a burst of changes, which ends after no change for the quiet time or after the max delay """
+        changed, t = self.inputs(watcher, timeout), time()
+        while changed and not self.Stopped and time() - t < self.MaxDelay:
+            new = self.inputs(watcher, min(self.Quiet, self.MaxDelay - (time() - t)))
+            if not new:
+                break
+            changed |= new
+        return changed
+
+    def inputs(self, watcher, timeout):
+        """ :returns: changed input files, the waiting continues until the timeout if only files of the website changed """
+        end = time() + timeout
+        while True:
+            changed = {path for path in watcher.wait(max(0., end - time())) if self.is_input(path)}
+            if changed or self.Stopped or time() >= end:
+                return changed
+
+    def build(self, changed):
+        """ :returns: whether anything changed """
+        if self.TC is not None:
+            ContentTree.scan()  # new analysis output has to be linked
+            self.Website.build_tc(self.TC)
+            html.Writer.flush()
+            html.Manifest.save()
+            data.Index.save()
+            return bool(changed)
+        return self.Website.build(changed=data.find_output_changes(changed))
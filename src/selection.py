@@ -7,6 +7,8 @@
 from src.utils import join, load_json, BaseDir, make_list, Path, create_dir
 import src.html as html
 import src.info as data
+import src.dependencies as dep
+from src.dependencies import Graph
 
 
 class Selections(html.File):
@@ -23,21 +25,29 @@ class Selections(html.File):
         Selections.Data = load_json(join(BaseDir, 'data', 'selection.json'))
 
     @staticmethod
-    def copy_data():
-        return data.copy_from_server(join(data.ServerSoft, 'Runinfos', 'selection.json'))
+    def has_new_data():
+        """ :returns: whether the selections were changed by the last transfer from the server """
+        return bool(data.Synced.get('selection'))
 
     def build(self, redo=False):
-        if Selections.copy_data() or redo:
+        if Selections.has_new_data() or redo:
             Selections.update()
             self.build_selections()
             self.set_filename(join(Selections.Dir, 'index.html'))
             self.set_header(self.Website.get_header(f'Run Plan Selections'))
-            self.set_body('\n'.join([self.Website.NavBar.get(), html.table('Run Plan Selections', self.header, self.body, w='600px')]))
+            self.set_body([self.Website.NavBar.get(), html.table('Run Plan Selections', self.header, self.body, w='600px')])
             self.save()
 
     def build_selections(self):
-        for sel, d in self.Data.items():
-            Selection(self.Website, verbose=False).build(sel, d)
+        for sel in self.Data:
+            self.build_selection(sel)
+
+    def build_selection(self, name):
+        if name in Selections.Data:
+            s = Selection(self.Website, verbose=False)
+            s.build(name, Selections.Data[name])
+            rps = [dep.rp(tc, data.RunPlan.make_tag(rp)) for tc, d in Selections.Data[name].items() for rp in d]
+            Graph.add(s.FileName, (self.build_selection, name), dep.sel(name), *rps)
 
     @property
     def header(self):
@@ -47,7 +57,7 @@ class Selections(html.File):
     def body(self):
         rs = []
         for key, d1 in self.Data.items():
-            duts = set([data.TestCampaigns[tc].get_runplan(rp).DUTs[i - 1] for tc, d0 in d1.items() for rp, l0 in d0.items() for i in make_list(l0) if tc in data.TestCampaigns])
+            duts = dict.fromkeys(data.TestCampaigns[tc].get_runplan(rp).DUTs[i - 1] for tc, d0 in d1.items() for rp, l0 in d0.items() for i in make_list(l0) if tc in data.TestCampaigns)  # stable order
             p = self.Dir.joinpath(key)
             r = [self.link(p.joinpath('sel.html'), key), self.link(p.joinpath('plots.html'), html.LinkIcon, use_name=False, warn=False)]
             rs.append(r + [(', '.join(self.link(dut.RelDir, dut.Name, new_tab=True) for dut in duts), html.style(left=True)), (', '.join(d1.keys()), html.style(left=True))])
@@ -67,7 +77,7 @@ class Selection(html.File):
         title = f'Runplan selection {name}'
         self.set_header(self.Website.get_header(title))
         rows = sum([self.tc_rows(tc, d1) for tc, d1 in d.items()], start=[])
-        self.set_body('\n'.join([self.Website.NavBar.get(), html.table(title, self.TabHead, rows, w='350px')]))
+        self.set_body([self.Website.NavBar.get(), html.table(title, self.TabHead, rows, w='350px')])
         self.save()
 
     def tc_rows(self, tc, d):
@@ -0,0 +1,179 @@
+# --------------------------------------------------------
+#       serves the website with pages which are rendered on request
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+from collections import OrderedDict
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from threading import Lock, Thread
+from re import compile as re_compile
+from urllib.parse import urlsplit
+from src.utils import info, BaseDir, Path, choose, ContentTree
+from src.scheduler import Scheduler, make_watcher
+import src.html as html
+import src.info as data
+import src.dependencies as dep
+import src.structure as structure
+from src.dependencies import Graph
+
+
+class PageCache:
+    """ Rendered pages (bytes) with a bounded total size. The least recently used pages are removed first. """
+
+    def __init__(self, max_size):
+        self.Pages = OrderedDict()
+        self.MaxSize = max_size
+        self.Size = 0
+        self.Hits = self.Misses = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} with {len(self)} pages ({self.Size / 2 ** 20:.1f} of {self.MaxSize / 2 ** 20:.0f} MB), {self.Hits} hits, {self.Misses} misses'
+
+    def __len__(self):
+        return len(self.Pages)
+
+    def get(self, page):
+        if page in self.Pages:
+            self.Hits += 1
+            self.Pages.move_to_end(page)
+            return self.Pages[page]
+        self.Misses += 1
+
+    def put(self, page, body):
+        self.remove(page)
+        self.Pages[page] = body
+        self.Size += len(body)
+        while self.Size > self.MaxSize and len(self) > 1:
+            self.remove(next(iter(self.Pages)))
+
+    def remove(self, page):
+        self.Size -= len(self.Pages.pop(page, b''))
+
+    def invalidate(self, changed):
+        """ removes all pages of the changed test campaigns and the pages which read any other changed input.
+            :returns: number of removed pages """
+        n = len(self)
+        if any(dep.is_structural(key) for key in changed):
+            self.Pages.clear()
+            self.Size = 0
+            return n
+        tcs = {dep.get_tc(key) for key in changed} - {None}
+        for page in [p for p in self.Pages if Graph.Inputs.get(p, set()) & changed or tcs & {dep.get_tc(key) for key in Graph.Inputs.get(p, ())}]:
+            self.remove(page)
+        return n - len(self)
+
+
+class Handler(SimpleHTTPRequestHandler):
+    """ Serves the rendered pages and all other files from the base directory. The urls start with /psi2 like the links of the website. """
+
+    def translate_path(self, path):
+        path = urlsplit(path).path
+        return super().translate_path(path[len(Server.Prefix):] if path.startswith(f'{Server.Prefix}/') else path)
+
+    def do_GET(self):
+        if urlsplit(self.path).path in ['', '/']:
+            self.send_response(301)
+            self.send_header('Location', f'{Server.Prefix}/content/')
+            return self.end_headers()
+        page = Path(self.translate_path(self.path))
+        body = self.server.Site.render(page.joinpath('index.html') if page.is_dir() else page)
+        if body is None:
+            return super().do_GET()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Server:
+    """ Serves the website with the model in memory. The tables are rendered at their first request and kept in a PageCache.
+        The inputs are watched like in the daemon, the pages which depend on changed inputs are removed from the cache after the update of the model. """
+
+    Prefix = '/psi2'
+    Pages = re_compile(r'index(-\d+)?\.html')  # pages of the paginated tables (see html.page_name)
+
+    def __init__(self, website):
+        self.Website = website
+        self.Host = website.Config.get_value('Serve', 'host', default='localhost')
+        self.Port = website.Config.get_value('Serve', 'port', default=8000)
+        self.Interval = website.Config.get_value('Serve', 'poll interval', default=10.)
+        self.Cache = PageCache(website.Config.get_value('Serve', 'cache size', default=200.) * 2 ** 20)
+        self.Lock = Lock()  # the tables are shared objects, so only one page is rendered at a time
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} on http://{self.Host}:{self.Port}{Server.Prefix}/content/'
+
+    def route(self, page):
+        """ :returns: the builder (method, *args) which renders [page] or None if it is a static file """
+        w, p = self.Website, page.relative_to(BaseDir).parts
+        if len(p) < 2 or p[0] != 'content' or page.suffix != '.html':
+            return
+        p, tc = p[1:], data.TestCampaigns.get(p[3] if p[1] == 'diamonds' and len(p) > 3 else p[2] if len(p) > 2 else None)
+        static = {('index.html',): (w.Home.build,), ('nav.html',): (w.NavBar.build,), ('Location.html',): (w.create_location,), ('AmpBoards.html',): (w.create_boards,),
+                  ('selections', 'index.html'): (w.Selection.build, True)}
+        if p in static:
+            return static[p]
+        if p[0] == 'duts' and len(p) == 2:
+            return w.DUTTable.build_all,
+        if p[0] == 'selections' and len(p) == 3 and p[2] == 'sel.html':
+            return w.Selection.build_selection, p[1]
+        if p[0] == 'beamtests' and len(p) == 3 and tc is not None:
+            return (w.FullRunTable.build, tc.ID) if Server.Pages.fullmatch(p[2]) else (w.RunPlanTable.build, tc.ID) if p[2] == 'RunPlans.html' else None
+        if p[0] == 'diamonds' and len(p) == 3 and Server.Pages.fullmatch(p[2]) and p[1] in data.DUTs:
+            return w.DiaRunPlanTable.build, p[1]
+        if p[0] == 'diamonds' and p[-1] == 'index.html' and p[1] in data.DUTs:
+            if len(p) == 4 and tc is not None:
+                return w.DiaRunPlanTable.build_dut_tc, tc.ID, p[1]
+            if len(p) == 5 and tc is not None:
+                return next(((w.RunTables.build_rp, tc.ID, rp.Tag, rp.get_dut_nr(p[1])) for rp in tc.get_dut_runplans(p[1]) if str(rp) == p[3]), None)
+
+    def render(self, page):
+        """ :returns: the html of [page] as bytes or None if it is not rendered by the website. All pages of the same builder are cached. """
+        with self.Lock:
+            body = self.Cache.get(str(page))
+            if body is None:
+                builder = self.route(page)
+                if builder is None:
+                    return
+                f, *args = builder
+                html.Capture = {}
+                try:
+                    f(*args)
+                finally:
+                    pages, html.Capture = html.Capture, None
+                [self.Cache.put(p, b) for p, b in pages.items()]
+                body = pages.get(str(page))
+            return body
+
+    def refresh(self, paths=()):
+        """ updates the model and removes the pages of the changed inputs from the cache """
+        with self.Lock:
+            ContentTree.scan()
+            changed = choose(data.update(), set()) | data.find_output_changes(paths)
+            n = self.Cache.invalidate(changed)
+            if changed:
+                info(f'removed {n} of {n + len(self.Cache)} cached pages for {len(changed)} changed inputs')
+
+    def watch(self):
+        watcher = make_watcher(*Scheduler(self.Website).paths())
+        while True:
+            self.refresh(watcher.wait(self.Interval))
+
+    def run(self):
+        with self.Lock:
+            data.load_tcs()
+            Graph.clear()
+            structure.make_dirs()  # the links only point to existing directories
+            ContentTree.scan()
+        httpd = ThreadingHTTPServer((self.Host, self.Port), partial(Handler, directory=str(BaseDir)))
+        httpd.Site = self
+        Thread(target=self.watch, daemon=True).start()
+        info(f'serving the website on http://{self.Host}:{self.Port}{Server.Prefix}/content/ (stop with Ctrl+C)')
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            info(f'stopped serving: {self.Cache}')
+        finally:
+            httpd.server_close()
@@ -13,15 +13,25 @@ SDir = join(BaseDir, 'content')
 
 
 def make_diamond_dirs():
+    for tc in data.TestCampaigns:
+        make_tc_diamond_dirs(tc)
+
+
+def make_tc_diamond_dirs(tc):
     d1 = create_dir(SDir, 'diamonds')
-    for tc in data.TestCampaigns.values():
-        for dut in tc.DUTs:
-            d2 = create_dir(d1, dut)
-            d3 = create_dir(d2, tc.ID)
-            for run in tc.get_dut_runs(dut):
-                create_dir(d3, str(run))
-            for rp in tc.get_dut_runplans(dut):
-                create_dir(d3, str(rp))
+    tc = data.TestCampaigns[tc]
+    for dut in tc.DUTs:
+        d2 = create_dir(d1, dut)
+        d3 = create_dir(d2, tc.ID)
+        for run in tc.get_dut_runs(dut):
+            create_dir(d3, str(run))
+        for rp in tc.get_dut_runplans(dut):
+            create_dir(d3, str(rp))
+
+
+def make_tc_dirs(tc):
+    create_dir(SDir, 'beamtests', tc)
+    make_tc_diamond_dirs(tc)
 
 
 def make_beamtest_dirs():
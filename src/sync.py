@@ -0,0 +1,126 @@
+# --------------------------------------------------------
+#       transports to copy the input files from the analysis server
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from os import listdir, stat
+from os.path import isdir, basename
+from shutil import copy2
+from subprocess import check_output, run as run_cmd, DEVNULL
+from time import time
+from src.utils import choose, Path, BaseDir
+
+
+class SyncResult:
+    """ Changed files, transferred bytes and duration of one or more transfers. It is True if any file changed. """
+
+    def __init__(self, files=None, size=0, duration=0.):
+        self.Files = choose(files, [])
+        self.Bytes = size
+        self.Duration = duration
+
+    def __bool__(self):
+        return bool(self.Files)
+
+    def __add__(self, other):
+        return SyncResult(self.Files + other.Files, self.Bytes + other.Bytes, self.Duration + other.Duration)
+
+    def __repr__(self):
+        return f'{len(self.Files)} changed files, {self.Bytes / 1024:.1f} kB in {self.Duration:.2f} s'
+
+
+class Backend(ABC):
+    """ Base class of the transports. Subclasses implement copy() and listdir(), fetch() runs a bounded number of copies concurrently. """
+
+    def __init__(self, workers=4):
+        self.Workers = max(1, workers)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} with {self.Workers} concurrent transfers'
+
+    @abstractmethod
+    def copy(self, remote, local) -> SyncResult:
+        """ copies the file [remote] into the directory or to the file path [local] if it changed """
+
+    @abstractmethod
+    def listdir(self, remote):
+        """ :returns: names of the entries of the remote directory """
+
+    def connect(self):
+        """ prepares the transfers, e.g. by opening a shared connection """
+        pass
+
+    def fetch(self, jobs):
+        """ copies all (remote, local) pairs, errors of the transfers are raised.
+            :returns: list of SyncResult in the order of the jobs """
+        jobs = list(jobs)
+        self.connect()
+        if self.Workers < 2 or len(jobs) < 2:
+            return [self.copy(*job) for job in jobs]
+        with ThreadPoolExecutor(min(self.Workers, len(jobs))) as pool:
+            return list(pool.map(lambda job: self.copy(*job), jobs))
+
+
+class RsyncBackend(Backend):
+    """ Copies with rsync over ssh. All transfers share a single ssh master connection. """
+
+    def __init__(self, host, workers=4, persist='10m'):
+        super().__init__(workers)
+        self.Host = host
+        self.SSH = ['ssh', '-o', 'ControlMaster=auto', '-o', 'ControlPath=~/.ssh/psi-website-%C', '-o', f'ControlPersist={persist}']
+
+    def connect(self):
+        if run_cmd(self.SSH + ['-O', 'check', self.Host], stdout=DEVNULL, stderr=DEVNULL).returncode:
+            check_output(self.SSH + [self.Host, 'true'])  # starts the master which stays open for ControlPersist
+
+    def copy(self, remote, local):
+        t = time()
+        out = check_output(['rsync', '-a', '-e', ' '.join(self.SSH), '--out-format=%i %l %n', f'{self.Host}:{remote}', str(local)]).decode()
+        items = [line.split(' ', 2) for line in out.splitlines() if line.startswith('>f')]  # only received files
+        files = [str(Path(local, name) if isdir(local) else Path(local)) for flags, size, name in items]
+        return SyncResult(files, sum(int(size) for flags, size, name in items), time() - t)
+
+    def listdir(self, remote):
+        return check_output(self.SSH + [self.Host, 'ls', str(remote)]).decode().split()
+
+
+class LocalBackend(Backend):
+    """ Copies from a local directory with the same layout as the server, e.g. for benchmarks and offline tests. """
+
+    def __init__(self, path, workers=4):
+        super().__init__(workers)
+        self.Dir = BaseDir.joinpath(path)
+
+    def __repr__(self):
+        return f'{super().__repr__()} from {self.Dir}'
+
+    def path(self, remote):
+        """ :returns: the location of the server path [remote] inside the local directory """
+        return self.Dir.joinpath(str(remote).removeprefix('~/').lstrip('/'))
+
+    def copy(self, remote, local):
+        t, src = time(), self.path(remote)
+        dst = Path(local, basename(src)) if isdir(local) else Path(local)
+        s = stat(src)
+        if dst.exists() and self.same(stat(dst), s):
+            return SyncResult(duration=time() - t)
+        copy2(src, dst)
+        return SyncResult([str(dst)], s.st_size, time() - t)
+
+    def listdir(self, remote):
+        return listdir(self.path(remote))
+
+    @staticmethod
+    def same(s0, s1):
+        """ same quick check as rsync: size and modification time """
+        return (s0.st_size, s0.st_mtime_ns) == (s1.st_size, s1.st_mtime_ns)
+
+
+def make_backend(config):
+    """ :returns: the transport which is chosen in the [Server] section of the config """
+    n = config.get_value('Server', 'transfers', default=4)
+    if config.get_value('Server', 'backend', default='rsync') == 'local':
+        return LocalBackend(config.get('Server', 'local dir'), n)
+    return RsyncBackend(config.get('Server', 'host'), n)
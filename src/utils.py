@@ -3,15 +3,19 @@
 # created on May 19th 2016 by M. Reichmann
 # --------------------------------------------------------
 
+from collections import Counter
+from collections.abc import Mapping
 from configparser import ConfigParser, NoOptionError, NoSectionError
 from copy import deepcopy
 from datetime import datetime, timedelta
 from functools import wraps
-from json import load, loads
-from os import _exit, mkdir
-from os.path import join, isdir, isfile
+from json import load, loads, dumps
+from os import _exit, scandir, stat, replace, remove, utime, umask, chmod
+from os.path import join, isdir, isfile, normpath
 from pathlib import Path
-from pickle import load as pload, dump as pdump
+from pickle import load as pload, dump as pdump, HIGHEST_PROTOCOL, UnpicklingError
+from hashlib import sha1
+from tempfile import NamedTemporaryFile
 from time import time
 
 from numpy import array, sqrt, average
@@ -21,6 +25,8 @@ from uncertainties import ufloat, ufloat_fromstr
 from uncertainties.core import Variable, AffineScalarFunc
 
 BaseDir = Path(__file__).resolve().parent.parent
+UMask = umask(0o022)
+umask(UMask)
 
 
 def get_t_str():
@@ -79,9 +85,11 @@ def get_elapsed_time(start, hrs=False):
 
 def create_dir(*path):
     path = join(*path)
-    if not isdir(path):
+    if not ContentTree.is_dir(path):
         info(f'creating directory: {path}')
-        mkdir(path)
+        Stats['stat calls'] += 1
+        Path(path).mkdir(parents=True, exist_ok=True)  # may have been created after the last scan
+        ContentTree.add(path, is_dir=True)
     return path
 
 
@@ -108,6 +116,14 @@ def load_json(path):
         return load(f)
 
 
+def write_atomic(path, content: bytes):
+    """ writes to a temporary file in the same directory which is renamed to [path], so readers never see a partially written file """
+    with NamedTemporaryFile('wb', dir=Path(path).parent, suffix='.tmp', delete=False) as f:
+        f.write(content)
+    chmod(f.name, 0o666 & ~UMask)  # temporary files are only readable by the owner
+    replace(f.name, path)
+
+
 def mean_sigma(values, weights=None):
     """ Return the weighted average and standard deviation. values, weights -- Numpy ndarrays with the same shape. """
     if len(values) == 1:
@@ -142,22 +158,16 @@ def isiter(v):
         return False
 
 
-def pickle(*rel_path, print_dur=False, use_args=False):
+def cached(cache, name, key):
+    """ stores the return value of the function in [cache]. [name] and [key] are called with the same arguments as the function, [key] has to return all its inputs. """
     def inner(func):
         @wraps(func)
-        def wrapper(*args, **kwargs):
-            file_name = ['_'.join(str(arg) for arg in args)] if use_args else ()
-            pickle_path = f'{join(BaseDir, "data", "metadata", *rel_path, *file_name)}.pickle'
-            redo = kwargs['_redo'] if '_redo' in kwargs else False
-            if isfile(pickle_path) and not redo:
-                with open(pickle_path, 'rb') as f:
-                    return pload(f)
-            prnt = print_dur and (kwargs['prnt'] if 'prnt' in kwargs else True)
-            t = (args[0].info if len(args) and hasattr(args[0], 'info') else info)(f'{args[0].__class__.__name__ if args else ""}: {func.__name__.replace("_", " ")} ...', endl=False, prnt=prnt)
-            value = func(*args, **kwargs)
-            with open(pickle_path, 'wb') as f:
-                pdump(value, f)
-            (args[0].add_to_info if args and hasattr(args[0], 'add_to_info') else add_to_info)(t, prnt=prnt)
+        def wrapper(*args, _redo=False, **kwargs):
+            file_name, k = name(*args, **kwargs), cache.make_key(*key(*args, **kwargs))
+            found, value = (False, None) if _redo else cache.load(file_name, k)
+            if not found:
+                value = func(*args, **kwargs)
+                cache.save(file_name, k, value)
             return value
         return wrapper
     return inner
@@ -268,6 +278,202 @@ class Configuration(ConfigParser):
             print()
 
 
+class FileTree:
+    """ Indexed snapshot of a directory tree. It is created with a single walk and has to be updated for files which are written afterwards. """
+
+    def __init__(self, path):
+        self.Dir = Path(path)
+        self.Files = None
+        self.Dirs = None
+        self.Listing = None  # {dir: names of its files and dirs}
+        self.Added = None  # files added in a worker process
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} of {self.Dir} ({"not scanned" if self.Files is None else f"{len(self.Files)} files, {len(self.Dirs)} dirs"})'
+
+    def scan(self):
+        self.Files, self.Dirs, self.Listing = set(), set(), {}
+        if isdir(self.Dir):
+            self.Dirs.add(str(self.Dir))
+            self._scan(str(self.Dir), set())
+        return self
+
+    def _scan(self, path, visited):
+        Stats['stat calls'] += 1
+        names = []
+        with scandir(path) as it:
+            for entry in it:
+                names.append(entry.name)
+                if entry.is_dir():
+                    if entry.is_symlink():
+                        s = stat(entry.path)
+                        if (s.st_dev, s.st_ino) in visited:
+                            continue
+                        visited.add((s.st_dev, s.st_ino))
+                    self.Dirs.add(entry.path)
+                    self._scan(entry.path, visited)
+                else:
+                    self.Files.add(entry.path)
+        self.Listing[path] = frozenset(names)
+
+    def key(self, path):
+        """ :returns: normalised absolute path if it is inside the tree, otherwise None """
+        path = normpath(BaseDir.joinpath(path))
+        return path if path == str(self.Dir) or path.startswith(f'{self.Dir}/') else None
+
+    def exists(self, path):
+        return self.is_file(path) or self.is_dir(path)
+
+    def is_file(self, path):
+        key = self.key(path)
+        if key is None:
+            Stats['stat calls'] += 1
+            return isfile(BaseDir.joinpath(path))
+        return key in (self.Files if self.Files is not None else self.scan().Files)
+
+    def is_dir(self, path):
+        key = self.key(path)
+        if key is None:
+            Stats['stat calls'] += 1
+            return isdir(BaseDir.joinpath(path))
+        return key in (self.Dirs if self.Dirs is not None else self.scan().Dirs)
+
+    def listing(self, path):
+        """ :returns: names of the files and dirs in the directory [path] or None if it is outside of the tree """
+        key = self.key(path)
+        if key is None:
+            return None
+        return (self.Listing if self.Listing is not None else self.scan().Listing).get(key, frozenset())
+
+    def add(self, path, is_dir=False):
+        key = self.key(path)
+        if key is not None and self.Files is not None:
+            (self.Dirs if is_dir else self.Files).add(key)
+            d, name = key.rsplit('/', 1)
+            if name not in self.Listing.get(d, ()):
+                self.Listing[d] = self.Listing.get(d, frozenset()) | {name}
+        if key is not None and self.Added is not None:
+            self.Added.append((key, is_dir))
+
+    def discard(self, path):
+        key = self.key(path)
+        if key is not None and self.Files is not None:
+            self.Files.discard(key)
+            d, name = key.rsplit('/', 1)
+            if name in self.Listing.get(d, ()):
+                self.Listing[d] = self.Listing[d] - {name}
+
+
+class LazyDict(Mapping):
+    """ Dictionary with fixed keys whose values are only loaded at the first access. """
+
+    def __init__(self, keys, load, values=None):
+        self.Keys = dict.fromkeys(keys)
+        self.Load = load
+        self.Values = {key: value for key, value in choose(values, {}).items() if key in self.Keys}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} with {len(self)} keys ({len(self.Values)} loaded)'
+
+    def __getitem__(self, key):
+        if key not in self.Values:
+            if key not in self.Keys:
+                raise KeyError(key)
+            self.Values[key] = self.Load(key)
+        return self.Values[key]
+
+    def __setitem__(self, key, value):
+        self.Keys[key] = None
+        self.Values[key] = value
+
+    def __contains__(self, key):
+        return key in self.Keys
+
+    def __iter__(self):
+        return iter(self.Keys)
+
+    def __len__(self):
+        return len(self.Keys)
+
+    def is_loaded(self, key):
+        return key in self.Values
+
+    def loaded(self):
+        """ :returns: dictionary of the values which are already loaded """
+        return {key: self.Values[key] for key in self.Keys if key in self.Values}
+
+
+class Cache:
+    """ Pickle store which names the files by a digest of all inputs and the code version, so stale files are never loaded.
+        The files are written atomically and the least recently used ones are removed if the store exceeds [max_size] (in MB). """
+
+    def __init__(self, path, version='', max_size=500):
+        self.Dir = Path(path)
+        self.Version = version
+        self.MaxSize = max_size * 2 ** 20
+        self.Hits = self.Misses = 0
+        self.LoadTime = self.SaveTime = 0.
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} in {self.Dir}: {self.Hits} hits, {self.Misses} misses, loaded in {self.LoadTime:.2f} s, saved in {self.SaveTime:.2f} s'
+
+    @staticmethod
+    def digest(*inputs):
+        """ :returns: sha1 of bytes, arrays and json serialisable objects """
+        h = sha1()
+        for i in inputs:
+            h.update(i if type(i) is bytes else i.tobytes() if hasattr(i, 'tobytes') else dumps(i, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def make_key(self, *inputs):
+        return self.digest(self.Version, *inputs)
+
+    def path(self, name, key):
+        return self.Dir.joinpath(f'{name}-{key}.pickle')
+
+    def load(self, name, key):
+        """ :returns: (found, value) """
+        t, p = time(), self.path(name, key)
+        Stats['stat calls'] += 1
+        if isfile(p):
+            try:
+                with open(p, 'rb') as f:
+                    value = pload(f)
+                utime(p)  # mark as recently used
+                self.Hits += 1
+                Stats['cache hits'] += 1
+                self.LoadTime += time() - t
+                return True, value
+            except (EOFError, UnpicklingError, AttributeError, ImportError):
+                warning(f'could not load {p}')
+        self.Misses += 1
+        Stats['cache misses'] += 1
+        return False, None
+
+    def save(self, name, key, value):
+        t = time()
+        self.Dir.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile('wb', dir=self.Dir, suffix='.tmp', delete=False) as f:
+            pdump(value, f, HIGHEST_PROTOCOL)
+        replace(f.name, self.path(name, key))
+        self.evict()
+        self.SaveTime += time() - t
+
+    def evict(self):
+        files = sorted(((p.stat().st_mtime, p.stat().st_size, p) for p in self.Dir.glob('*.pickle')), reverse=True)
+        size = 0
+        for mtime, s, p in files:
+            size += s
+            if size > self.MaxSize:
+                remove(p)
+
+    def stats(self):
+        return {'hits': self.Hits, 'misses': self.Misses, 'load time': self.LoadTime, 'save time': self.SaveTime}
+
+    def clear(self):
+        [remove(p) for p in self.Dir.glob('*.pickle')]
+
+
 class FitRes:
     def __init__(self, fit_obj=None, form=''):
         self.Pars = self.load_pars(fit_obj)
@@ -310,6 +516,8 @@ def do_nothing():
 
 
 PBAR = PBar()
+Stats = Counter()  # counters of the build report (see src.report)
+ContentTree = FileTree(BaseDir.joinpath('content'))
 
 
 def update_pbar(f):
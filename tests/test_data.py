@@ -0,0 +1,37 @@
+# --------------------------------------------------------
+#       tests of the HDF5 data cache
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+import sys
+from subprocess import run
+import h5py
+import src.info as data
+from src.info import DataCache
+
+
+def make_tc(monkeypatch, tmp_path):
+    """ :returns: test campaign with a single compacted dataset of 200 runs in a temporary file """
+    filename = tmp_path.joinpath('data.hdf5')
+    with h5py.File(filename, 'w') as f:
+        f.create_group('201708').create_dataset('1', (200, 10, 2), 'd')
+    cache = DataCache(filename)
+    cache.compact()
+    monkeypatch.setattr(data, 'Data', cache)
+    tc = data.TestCampaign.__new__(data.TestCampaign)
+    tc.ID = '201708'
+    cache.update()
+    tc.Snapshot = tc.data
+    return tc
+
+
+def write(filename, nr, value):
+    run([sys.executable, '-c', f'import h5py\nwith h5py.File("{filename}", "a") as f:\n    f["201708"]["1"][{nr}, 0, 0] = {value}'], check=True)
+
+
+def test_external_write(monkeypatch, tmp_path):
+    tc = make_tc(monkeypatch, tmp_path)
+    write(data.Data.FileName, 150, 42.)
+    assert data.Data.update()
+    assert tc.find_new_data() == [(1, 150)]
+    assert tc.data[0, 150, 0, 0] == 42.
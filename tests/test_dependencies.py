@@ -0,0 +1,60 @@
+# --------------------------------------------------------
+#       tests of the incremental rebuilds of the dependency graph
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+import src.dependencies as dep
+from src.dependencies import DependencyGraph
+
+
+class Site:
+    """ builds a page for every DUT slot of every run plan, like RunTables.build_tc and build_rp """
+
+    def __init__(self, graph, runplans):
+        self.Graph = graph
+        self.RunPlans = runplans  # {tag: number of DUT slots}
+        self.Built = []
+
+    def build_tc(self, tc):
+        [self.build_rp(tc, tag, i) for tag, n in self.RunPlans.items() for i in range(n)]
+
+    def build_rp(self, tc, tag, dut_nr):
+        if dut_nr >= self.RunPlans[tag]:  # raises KeyError for removed run plans
+            raise IndexError(dut_nr)
+        self.Built.append((tag, dut_nr))
+        self.Graph.add(f'{tc}/{tag}/{dut_nr}', (self.build_rp, tc, tag, dut_nr), dep.rp(tc, tag), dep.run(tc, 1))
+
+    def build_all(self, tc):
+        self.Graph.add(f'test campaign {tc}', (self.build_tc, tc), dep.tc(tc))
+        self.build_tc(tc)
+
+
+def make_site():
+    site = Site(DependencyGraph(), {'01': 2, '09': 3})
+    site.build_all('201708')
+    return site
+
+
+def test_removed_runplan():
+    site = make_site()
+    site.RunPlans.pop('09')
+    site.Graph.rebuild({dep.tc('201708'), dep.rp('201708', '09')})
+    assert not any('/09/' in page for page in site.Graph.Inputs)
+    site.Graph.rebuild({dep.run('201708', 1)})  # the next incremental build must not call the removed builders
+    assert ('09', 0) not in site.Built[-2:]
+
+
+def test_removed_dut_slot():
+    site = make_site()
+    site.RunPlans['09'] = 2
+    site.Graph.rebuild({dep.tc('201708')})
+    assert '201708/09/2' not in site.Graph.Inputs
+    site.Graph.rebuild({dep.run('201708', 1)})
+
+
+def test_builders_called_once():
+    site = make_site()
+    n = len(site.Built)
+    site.Graph.rebuild({dep.tc('201708'), dep.run('201708', 1)})
+    assert len(site.Built) == 2 * n
+    assert len(site.Graph) == n + 1
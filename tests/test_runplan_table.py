@@ -0,0 +1,23 @@
+# --------------------------------------------------------
+#       tests of the dependencies of the run plan tables
+# created on October 18th 2026 by M. Reichmann (remichae@phys.ethz.ch)
+# --------------------------------------------------------
+
+from types import SimpleNamespace
+import src.dependencies as dep
+import src.runplan_table as runplan_table
+from src.dependencies import DependencyGraph
+from src.runplan_table import RunPlanTable
+
+
+def test_runs(monkeypatch):
+    rps = [SimpleNamespace(Tag='01', RunNumbers=[3, 4]), SimpleNamespace(Tag='02', RunNumbers=[5])]
+    tc = SimpleNamespace(ID='201708', RunPlans=rps, runplan_duts=['II6-A2'])
+    website = SimpleNamespace(get_header=lambda title: '', NavBar=SimpleNamespace(get=lambda: ''))
+    monkeypatch.setattr(runplan_table.data, 'TestCampaigns', {tc.ID: tc})
+    monkeypatch.setattr(runplan_table, 'Graph', DependencyGraph())
+    for name, value in [('title', ''), ('header', ['Nr.']), ('body', []), ('save', None)]:
+        monkeypatch.setattr(RunPlanTable, name, lambda *args, v=value: v)
+    RunPlanTable(website).build(tc.ID)
+    page = str(runplan_table.BaseDir.joinpath('content', 'beamtests', tc.ID, 'RunPlans.html'))
+    assert all(runplan_table.Graph.affected({dep.run(tc.ID, nr)}) == [page] for nr in [3, 4, 5])
@@ -8,18 +8,23 @@
 import src.html as html
 import src.info as data
 import src.structure as structure
+import src.dependencies as dep
+from src.dependencies import Graph
 from src.dut_table import DUTTable
 from src.home import Home
 from src.nav_bar import NavBar
 from src.run_table import RunTables, FullRunTable
 from src.runplan_table import RunPlanTable, DiaRunPlanTable
 from src.selection import Selections
+from src.scheduler import Scheduler
+from src.server import Server
+from src.report import Report
 from src.utils import *
 
 
 class Website(html.File):
 
-    def __init__(self, config='main.ini'):
+    def __init__(self, config='main.ini', workers=None):
 
         super().__init__()
 
@@ -29,8 +34,12 @@ class Website(html.File):
         self.Icon = self.Config.get('Home Page', 'icon')
         self.TextSize = self.Config.get('Home Page', 'text size')
         self.Color = self.Config.get('Home Page', 'color')
-        self.Count = 0
-        self.StartTime = time()
+        self.Workers = choose(workers, self.Config.get_value('Build', 'workers', default=1))
+        html.Minify = self.Config.get_value('Build', 'minify', default=False)
+        html.Compress = self.Config.get_list('Build', 'compress')
+        html.PageSize = self.Config.get_value('Build', 'page size', default=0)
+        [warning(f'no compressor for .{ext} files, install brotli for .br') for ext in html.Compress if ext not in html.Compressors]
+        html.Writer.configure(self.Config.get_value('Build', 'write threads', default=4), self.Config.get_value('Build', 'max pending', default=64))
 
         # MODULES
         self.NavBar = NavBar()
@@ -43,26 +52,54 @@ class Website(html.File):
         self.Selection = Selections(self)
 
     def run(self, tc=None):
-        while True:
-            print_banner(f'starting iteration ({self.Count:04d}), running for {get_elapsed_time(self.StartTime, hrs=True)}', color='red')
-            self.build() if tc is None else self.build_tc(tc)
-            self.Count += 1
+        """ rebuilds the website [or only the test campaign tc] whenever the inputs change, until SIGINT or SIGTERM """
+        Scheduler(self, tc).run()
 
-    def build(self, redo=False):
+    def serve(self):
+        """ serves the website and renders the pages on request, see src/server.py """
+        Server(self).run()
+
+    def build(self, redo=False, changed=None):
+        """ :param changed: additional changed inputs, e.g. from the analysis output
+            :returns: whether anything was rebuilt """
         t = info('building website ...')
-        if data.update() or redo:
+        Report.start(workers=self.Workers, version=data.TCCache.Version)
+        with Report.stage('scan'):
+            ContentTree.scan()
+        changed = choose(data.update(), set()) | choose(changed, set())
+        full = redo or Graph.needs_full(changed)
+        if full:
+            self.build_all()
+        elif changed:
+            with Report.stage('rebuild'):
+                Graph.rebuild(changed)
+        with Report.stage('selections'):
+            self.Selection.build(full)
+        with Report.stage('flush'):
+            html.Writer.flush()
+        html.Manifest.save()
+        data.Index.save()
+        Report.save(self.Config.get_value('Build', 'report', default=''), self.Config.get_value('Build', 'report size', default=1000), full=full, changed=len(changed))
+        print(f'Done! ({get_elapsed_time(t)})')
+        return full or bool(changed)
+
+    def build_all(self):
+        data.load_tcs()
+        Graph.clear()
+        for tc in data.TestCampaigns:  # rebuilds all pages of a test campaign if its structure changes
+            Graph.add(f'test campaign {tc}', (self.build_tc, tc), dep.tc(tc))
+        with Report.stage('dirs'):
             structure.make_dirs()
-            self.FullRunTable.build_all()
-            self.RunTables.build_all()
-            self.RunPlanTable.build_all()
-            self.DiaRunPlanTable.build_all()
-            self.DUTTable.build_all()
+        for table in [self.FullRunTable, self.RunTables, self.RunPlanTable, self.DiaRunPlanTable, self.DUTTable]:
+            with Report.stage(table.__class__.__name__):
+                table.build_all()
+        with Report.stage('Home'):
             self.Home.build()
+        with Report.stage('NavBar'):
             self.NavBar.build()
-        self.Selection.build(redo)
-        print(f'Done! ({get_elapsed_time(t)})')
 
     def build_tc(self, tc):
+        structure.make_tc_dirs(tc)
         self.RunTables.build_tc(tc)
         self.FullRunTable.build(tc)
         self.RunPlanTable.build(tc)
@@ -99,14 +136,14 @@ class Website(html.File):
     def create_location(self):
         self.set_filename(BaseDir, 'content', 'Location.html')
         self.set_header(self.get_header(f'Location'))
-        self.set_body('\n'.join([self.NavBar.get(), html.empty_line(3), html.heading('Paul Scherrer Institut (PSI)', 2), html.image(join('figures', 'PSIAir.jpg'), w=1200)]))
+        self.set_body([self.NavBar.get(), html.empty_line(3), html.heading('Paul Scherrer Institut (PSI)', 2), html.image(join('figures', 'PSIAir.jpg'), w=1200)])
         self.save()
 
     def create_boards(self):
         self.set_filename(BaseDir, 'content', 'AmpBoards.html')
         self.set_header(self.get_header(f'Amplifier Boards'))
         rows = sorted([[str(nr), option] for option in self.Config.options('Boards') for nr in self.Config.get_list('Boards', option)])
-        self.set_body('\n'.join([self.NavBar.get(), html.table('Pad Amplifier Boards', ['Nr.', 'Pulser Type'], rows, html.style(left=True))]))
+        self.set_body([self.NavBar.get(), html.table('Pad Amplifier Boards', ['Nr.', 'Pulser Type'], rows, html.style(left=True))])
         self.save()
 
 
@@ -118,12 +155,22 @@ if __name__ == '__main__':
     p.add_argument('-t', action='store_true')
     p.add_argument('-d', nargs='?', default=None)
     p.add_argument('-tc', nargs='?', default=None)
+    p.add_argument('-j', nargs='?', type=int, default=None, help='number of worker processes')
+    p.add_argument('--compact', action='store_true', help='rewrite data.hdf5 with resizable datasets and exit')
+    p.add_argument('--serve', action='store_true', help='serve the website and render the pages on request (see [Serve] in config/main.ini)')
     args = p.parse_args()
 
-    z = Website()
-    r = data.RunPlan('03.3', '201708-2')
-    c = data.TestCampaigns['201508']
-    run = c.runplan_runs[-18]
-    dut = data.DUTs['II6-B2']
-    if not args.t:
+    if args.compact:
+        info('compacted {} ({:.1f} MB -> {:.1f} MB)'.format(data.Data.FileName, *[s / 2 ** 20 for s in data.Data.compact()]))
+        exit()
+
+    z = Website(workers=args.j)
+    if args.t:
+        r = data.RunPlan('03.3', '201708-2')
+        c = data.TestCampaigns['201508']
+        run = c.runplan_runs[-18]
+        dut = data.DUTs['II6-B2']
+    elif args.serve:
+        z.serve()
+    else:
         z.run(args.tc)